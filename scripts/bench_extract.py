@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark the page extraction engines
+Parses every data/*.html of each nishikie source with each engine in a
+fresh process and reports per-page parse time and peak resident memory
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.extract import ENGINES, parse_page
+
+NISHIKIE_DIR = Path(__file__).parent.parent / "src" / "nishikie"
+
+
+def child(engine: str, data_dir: str):
+    files = sorted(str(p) for p in Path(data_dir).glob("*.html"))
+
+    start = time.perf_counter()
+    for file in files:
+        parse_page(file, engine)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({"pages": len(files), "seconds": elapsed}))
+
+
+def run(engine: str, data_dir: Path):
+    proc = subprocess.Popen([sys.executable, __file__, "--child", engine, str(data_dir)],
+                            stdout=subprocess.PIPE, text=True)
+    out = proc.stdout.read()
+    _, _, rusage = os.wait4(proc.pid, 0)
+    result = json.loads(out)
+    # ru_maxrss is KB on Linux, bytes on macOS
+    result["maxrss_mb"] = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return result
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+        return
+
+    print("{:<20} {:<6} {:>6} {:>12} {:>12}".format("source", "engine", "pages", "ms/page", "peak RSS MB"))
+    for data_dir in sorted(NISHIKIE_DIR.glob("*/data")):
+        for engine in ENGINES:
+            r = run(engine, data_dir)
+            print("{:<20} {:<6} {:>6} {:>12.2f} {:>12.1f}".format(
+                data_dir.parent.name, engine, r["pages"],
+                r["seconds"] * 1000 / max(r["pages"], 1), r["maxrss_mb"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark the JSON backends
+Loads and re-serializes every JSON file under docs/iiif with each backend of
+dataset.output, checks that every backend writes the same bytes as the
+stdlib json module, and reports the time and throughput of each step
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import output
+
+DOCS_DIR = Path(__file__).parent.parent / "docs" / "iiif"
+
+# (profile, sort_keys): the published files keep their key order, the builders sort
+CASES = [("pretty", False), ("pretty", True), ("compact", True)]
+
+
+def main():
+    files = sorted(DOCS_DIR.rglob("*.json"))
+    raw = [file.read_bytes() for file in files]
+    total = sum(len(data) for data in raw)
+    print("{} files, {:.1f} MB".format(len(files), total / 1e6))
+
+    backends = ["json"]
+    output.backend = None
+    if output.backend_name() == "orjson":
+        backends.append("orjson")
+    else:
+        print("orjson is not installed; timing json only")
+
+    expected = {}
+    print("{:<8} {:<22} {:>10} {:>10}".format("backend", "step", "seconds", "MB/s"))
+    for backend in backends:
+        output.backend = backend
+
+        start = time.perf_counter()
+        docs = [output.loads(data) for data in raw]
+        elapsed = time.perf_counter() - start
+        print("{:<8} {:<22} {:>10.2f} {:>10.1f}".format(backend, "load", elapsed, total / 1e6 / elapsed))
+
+        for profile, sort_keys in CASES:
+            start = time.perf_counter()
+            encoded = [output.encode(doc, profile, sort_keys) for doc in docs]
+            elapsed = time.perf_counter() - start
+            step = "dump {}{}".format(profile, " sorted" if sort_keys else "")
+            size = sum(len(data) for data in encoded)
+            print("{:<8} {:<22} {:>10.2f} {:>10.1f}".format(backend, step, elapsed, size / 1e6 / elapsed))
+
+            # 全バックエンドで同一のバイト列になること
+            if (profile, sort_keys) not in expected:
+                expected[(profile, sort_keys)] = encoded
+            mismatches = [str(files[i]) for i in range(len(files))
+                          if encoded[i] != expected[(profile, sort_keys)][i]]
+            if mismatches:
+                sys.exit("{} {}: {} files differ from json, e.g. {}".format(
+                    backend, step, len(mismatches), mismatches[0]))
+
+            # 公開済みのファイルはキーの順序を保った pretty 出力と一致する
+            if (profile, sort_keys) == ("pretty", False):
+                changed = [str(files[i]) for i in range(len(files)) if encoded[i] != raw[i]]
+                if changed:
+                    print("{} files are not in the pretty format, e.g. {}".format(len(changed), changed[0]))
+
+    print("OK: output is byte-identical across backends")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the memory of a whole-corpus build
+Replays what the manifests and collections commands keep in memory for all
+harvested pages: the parsed records, as they arrive from the parsing pool,
+and the collection entries of every manifest. Each mode runs in a fresh
+process under tracemalloc and reports the peak:
+
+  dict   parsed pages and collection entries kept as nested dicts (before
+         dataset.model)
+  model  Record / Reference objects with __slots__ and interned labels
+"""
+
+import json
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import output
+from dataset.extract import parse_page
+from dataset.model import Record, Reference, manifest_v2, manifest_v3
+from dataset.pipeline import create_item, manifest_summary
+
+NISHIKIE_DIR = Path(__file__).parent.parent / "src" / "nishikie"
+MODES = ("dict", "model")
+
+# 解析プールの1回分の受け渡し（chunksize）に相当
+CHUNK = 64
+
+
+class FixedSizes:
+    """Image sizes without the image index, so both modes do the same work"""
+
+    def dimensions(self, url, probe):
+        return 1000, 800
+
+
+def child(mode: str, blob_path: str):
+    with open(blob_path, 'rb') as f:
+        chunks = pickle.load(f)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    # 解析結果の受け取り
+    pages = []
+    for chunk in chunks:
+        for page in pickle.loads(chunk):
+            pages.append(page if mode == "dict" else Record.from_page(page))
+
+    # マニフェストの作成（1件ずつ書き出して破棄）とコレクション用の要約の保持
+    manifests = []
+    for i, page in enumerate(pages):
+        record = Record.from_page(page) if mode == "dict" else page
+        prefix = "https://hi-ut.github.io/dataset/iiif/bench-{}".format(str(i+1).zfill(4))
+        item = create_item(prefix, record, FixedSizes(), None)
+        m_data = manifest_v2(item)
+        output.encode(m_data)
+        output.encode(manifest_v3(item, prefix + "/v3.json"), sort_keys=False)
+
+        # summary.jsonl から読み戻したものと同じ、新しい文字列の dict
+        summary = output.loads(output.encode(manifest_summary(m_data), "compact"))
+        manifests.append(summary if mode == "dict" else Reference.from_v2(summary))
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(json.dumps({"items": len(pages), "peak": peak, "seconds": elapsed}))
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+        return
+
+    files = sorted(str(p) for p in NISHIKIE_DIR.glob("*/data/*.html"))
+    print("parsing {} pages".format(len(files)))
+    pages = [parse_page(file) for file in files]
+    chunks = [pickle.dumps(pages[i:i + CHUNK]) for i in range(0, len(pages), CHUNK)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        blob_path = Path(tmp) / "pages.pickle"
+        with open(blob_path, 'wb') as f:
+            pickle.dump(chunks, f)
+
+        print("{:<6} {:>6} {:>12} {:>10}".format("mode", "items", "peak MB", "seconds"))
+        for mode in MODES:
+            out = subprocess.run([sys.executable, __file__, "--child", mode, str(blob_path)],
+                                 stdout=subprocess.PIPE, text=True, check=True).stdout
+            r = json.loads(out)
+            print("{:<6} {:>6} {:>12.1f} {:>10.2f}".format(mode, r["items"], r["peak"] / 1e6, r["seconds"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the dataset CLI
+Fails (exit status 1) when `dataset --help` or a no-op collection rebuild
+takes longer than its budget
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent / "src"
+
+RUNS = 7
+
+# seconds, median wall time including interpreter startup
+BUDGETS = {
+    "--help": 0.30,
+    "no-op collections": 0.50,
+}
+
+
+def measure(args):
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as docs:
+        cases = {
+            "python -c pass": ["-c", "pass"],
+            "--help": ["-m", "dataset", "--help"],
+            # an empty docs tree: nothing to read, so only startup is measured
+            "no-op collections": ["-m", "dataset", "--docs", docs, "collections"],
+        }
+
+        failed = False
+        for name, args in cases.items():
+            elapsed = measure(args)
+            budget = BUDGETS.get(name)
+            status = ""
+            if budget is not None:
+                status = "ok" if elapsed <= budget else "OVER BUDGET"
+                failed |= elapsed > budget
+            print("{:<20} {:>8.3f}s {:>8} {}".format(
+                name, elapsed, "{:.2f}s".format(budget) if budget else "", status))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
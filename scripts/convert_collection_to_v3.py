@@ -4,21 +4,24 @@ IIIF Collection v2 to v3 converter
 Converts collection JSON files from v2 to v3 format
 """
 
-import json
+import argparse
 import os
+import sys
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import output
+from dataset.model import Reference, reference_v3
 
-def convert_metadata(v2_metadata: List[Dict]) -> List[Dict]:
-    """Convert metadata from v2 to v3 format"""
-    v3_metadata = []
-    for item in v2_metadata:
-        v3_metadata.append({
-            "label": {"ja": [item["label"]]},
-            "value": {"ja": [item["value"]]}
-        })
-    return v3_metadata
+
+def v3_collection_id(v2_id: str) -> str:
+    """Map a v2 collection ID (including paged collection pages) to its v3 ID"""
+    # e.g. .../iiif/collection/nishikie.json or .../iiif/collection/nishikie_yokohama/1.json
+    path = v2_id.split("/iiif/collection/")[-1]
+    if path.startswith("2/"):
+        path = path[2:]
+    return f"https://hi-ut.github.io/dataset/iiif/collection/3/{path}"
 
 
 def convert_thumbnail(v2_thumbnail) -> List[Dict]:
@@ -49,33 +52,13 @@ def convert_manifest_reference(v2_manifest: Dict) -> Dict:
     manifest_name = v2_id.split("/")[-2]
     v3_id = f"https://hi-ut.github.io/dataset/iiif/3/{manifest_name}/manifest.json"
 
-    v3_manifest = {
-        "id": v3_id,
-        "type": "Manifest",
-        "label": {"ja": [v2_manifest.get("label", "")]}
-    }
-
-    # Add metadata if present
-    if "metadata" in v2_manifest:
-        v3_manifest["metadata"] = convert_metadata(v2_manifest["metadata"])
-
-    # Add thumbnail
-    if "thumbnail" in v2_manifest:
-        v3_manifest["thumbnail"] = convert_thumbnail(v2_manifest["thumbnail"])
-
-    # Add rights/license
-    if "license" in v2_manifest:
-        v3_manifest["rights"] = v2_manifest["license"]
-
-    return v3_manifest
+    return reference_v3(Reference.from_v2(v2_manifest), v3_id)
 
 
 def convert_collection_reference(v2_collection: Dict) -> Dict:
     """Convert collection reference from v2 to v3 format"""
     # Update collection ID to point to v3 version
-    v2_id = v2_collection["@id"]
-    filename = v2_id.split("/")[-1]
-    v3_id = f"https://hi-ut.github.io/dataset/iiif/collection/3/{filename}"
+    v3_id = v3_collection_id(v2_collection["@id"])
 
     v3_collection = {
         "id": v3_id,
@@ -94,9 +77,7 @@ def convert_collection(v2_collection: Dict) -> Dict:
     """Convert entire collection from v2 to v3 format"""
 
     # Extract ID and create v3 ID
-    v2_id = v2_collection["@id"]
-    filename = v2_id.split("/")[-1]
-    v3_id = f"https://hi-ut.github.io/dataset/iiif/collection/3/{filename}"
+    v3_id = v3_collection_id(v2_collection["@id"])
 
     v3_collection = {
         "@context": "http://iiif.io/api/presentation/3/context.json",
@@ -117,10 +98,8 @@ def convert_collection(v2_collection: Dict) -> Dict:
 
     # Handle partOf (was "within" in v2)
     if "within" in v2_collection:
-        within_url = v2_collection["within"]
-        within_filename = within_url.split("/")[-1]
         v3_collection["partOf"] = [{
-            "id": f"https://hi-ut.github.io/dataset/iiif/collection/3/{within_filename}",
+            "id": v3_collection_id(v2_collection["within"]),
             "type": "Collection"
         }]
 
@@ -148,9 +127,41 @@ def convert_collection(v2_collection: Dict) -> Dict:
     return v3_collection
 
 
-def main():
+def convert_paged_collection(v2_index: Dict, v2_pages: List[Dict]) -> Tuple[Dict, List[Dict]]:
+    """Convert a v2 paged collection (first/next pages) to a v3 collection
+    whose items are the pages, as nested collections"""
+    # v3 has no paging properties; the pages become nested collections
+    v3_index = convert_collection(v2_index)
+    v3_index["items"] = [convert_collection_reference(page) for page in v2_pages]
+
+    v3_pages = [convert_collection(page) for page in v2_pages]
+    return v3_index, v3_pages
+
+
+def read_pages(base_dir: Path, v2_index: Dict) -> List[Dict]:
+    """Follow first/next through the page files of a v2 paged collection"""
+    pages = []
+    uri = v2_index.get("first")
+    while uri:
+        page = output.load(str(base_dir / uri.split("/iiif/collection/")[-1]))
+        pages.append(page)
+        uri = page.get("next")
+    return pages
+
+
+def write_collection(v3_dir: Path, v3_collection: Dict):
+    output_path = v3_dir / v3_collection["id"].split("/iiif/collection/3/")[-1]
+    output.write_json(v3_collection, str(output_path), sort_keys=False)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Convert the v2 collections under docs/iiif/collection to v3")
+    parser.add_argument("--docs", default=str(Path(__file__).parent.parent / "docs"),
+                        help="output root holding iiif/collection (default: the repository docs/ directory)")
+    args = parser.parse_args(argv)
+
     # Set paths
-    base_dir = Path(__file__).parent.parent / "docs" / "iiif" / "collection"
+    base_dir = Path(args.docs) / "iiif" / "collection"
     v3_dir = base_dir / "3"
     v3_dir.mkdir(parents=True, exist_ok=True)
 
@@ -167,16 +178,25 @@ def main():
     for collection_path in collection_files:
         try:
             # Read v2 collection
-            with open(collection_path, 'r', encoding='utf-8') as f:
-                v2_collection = json.load(f)
+            v2_collection = output.load(str(collection_path))
 
             # Convert collection
-            v3_collection = convert_collection(v2_collection)
-
-            # Write v3 collection
-            output_path = v3_dir / collection_path.name
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(v3_collection, f, ensure_ascii=False, indent=4)
+            if "first" in v2_collection:
+                v3_collection, v3_pages = convert_paged_collection(
+                    v2_collection, read_pages(base_dir, v2_collection))
+            else:
+                v3_collection, v3_pages = convert_collection(v2_collection), []
+
+            # Write v3 collection (and its pages)
+            write_collection(v3_dir, v3_collection)
+            for v3_page in v3_pages:
+                write_collection(v3_dir, v3_page)
+
+            # Remove pages left over from a previous, longer run
+            pages_dir = v3_dir / collection_path.stem
+            for stale in pages_dir.glob("*.json"):
+                if stale.stem.isdigit() and int(stale.stem) > len(v3_pages):
+                    stale.unlink()
 
             print(f"Converted: {collection_path.name}")
             converted_count += 1
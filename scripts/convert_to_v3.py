@@ -1,83 +1,28 @@
 #!/usr/bin/env python3
 """
 IIIF Presentation API v2 to v3 converter
-Converts manifest.json files from v2 to v3 format
+Converts manifest.json files from v2 to v3 format, in parallel, skipping
+manifests whose v2 file is unchanged since the last run
 """
 
-import json
+import argparse
+import hashlib
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, List
-
-
-def convert_metadata(v2_metadata: List[Dict]) -> List[Dict]:
-    """Convert metadata from v2 to v3 format"""
-    v3_metadata = []
-    for item in v2_metadata:
-        v3_metadata.append({
-            "label": {"ja": [item["label"]]},
-            "value": {"ja": [item["value"]]}
-        })
-    return v3_metadata
-
-
-def convert_thumbnail(v2_thumbnail: Dict) -> List[Dict]:
-    """Convert thumbnail from v2 to v3 format"""
-    if not v2_thumbnail:
-        return []
-
-    return [{
-        "id": v2_thumbnail["@id"],
-        "type": "Image",
-        "format": v2_thumbnail.get("format", "image/jpeg"),
-        "width": v2_thumbnail.get("width"),
-        "height": v2_thumbnail.get("height")
-    }]
-
-
-def convert_canvas(v2_canvas: Dict) -> Dict:
-    """Convert canvas from v2 to v3 format"""
-    v3_canvas = {
-        "id": v2_canvas["@id"].replace("/canvas/", "/canvas/"),
-        "type": "Canvas",
-        "label": {"ja": [v2_canvas.get("label", "")]},
-        "height": v2_canvas["height"],
-        "width": v2_canvas["width"],
-        "items": []
-    }
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import output
+from dataset.model import Item, manifest_v3
+
+# Bump when convert_manifest changes its output, so that every manifest is
+# converted again on the next run
+CONVERTER_VERSION = 2
 
-    # Convert images to annotation page
-    if "images" in v2_canvas and v2_canvas["images"]:
-        annotations = []
-        for v2_image in v2_canvas["images"]:
-            resource = v2_image.get("resource", {})
-            annotation = {
-                "id": v2_image["@id"],
-                "type": "Annotation",
-                "motivation": "painting",
-                "body": {
-                    "id": resource["@id"],
-                    "type": "Image",
-                    "format": resource.get("format", "image/jpeg"),
-                    "height": resource.get("height"),
-                    "width": resource.get("width")
-                },
-                "target": v3_canvas["id"]
-            }
-            annotations.append(annotation)
-
-        v3_canvas["items"] = [{
-            "id": v2_canvas["@id"] + "/page",
-            "type": "AnnotationPage",
-            "items": annotations
-        }]
-
-    # Convert thumbnail
-    if "thumbnail" in v2_canvas:
-        v3_canvas["thumbnail"] = convert_thumbnail(v2_canvas["thumbnail"])
-
-    return v3_canvas
+# Source hashes of the last run, kept next to the v3 manifests (ignored by git)
+STATE_NAME = ".convert_state.json"
 
 
 def convert_manifest(v2_manifest: Dict, v3_base_url: str) -> Dict:
@@ -88,117 +33,163 @@ def convert_manifest(v2_manifest: Dict, v3_base_url: str) -> Dict:
     manifest_name = v2_id.split("/")[-2]  # e.g., nishikie_hi-0001
     v3_id = f"{v3_base_url}/{manifest_name}/manifest.json"
 
-    v3_manifest = {
-        "@context": "http://iiif.io/api/presentation/3/context.json",
-        "id": v3_id,
-        "type": "Manifest",
-        "label": {"ja": [v2_manifest.get("label", "")]},
-    }
+    # Read into the shared model, then write v3 from it (as the builder does)
+    return manifest_v3(Item.from_v2(v2_manifest), v3_id)
 
-    # Add metadata
-    if "metadata" in v2_manifest:
-        v3_manifest["metadata"] = convert_metadata(v2_manifest["metadata"])
 
-    # Add summary (from description if exists)
-    if "description" in v2_manifest:
-        v3_manifest["summary"] = {"ja": [v2_manifest["description"]]}
+def convert_file(manifest_path: str, output_path: str, v3_base_url: str,
+                 profile: str, compressions: List[str]) -> str:
+    """Convert one v2 manifest file; return the sha256 of the v2 input.
+    The output profile is passed explicitly, as worker processes do not
+    share the parent's dataset.output settings"""
+    with open(manifest_path, 'rb') as f:
+        data = f.read()
 
-    # Add requiredStatement (attribution)
-    if "attribution" in v2_manifest:
-        v3_manifest["requiredStatement"] = {
-            "label": {"ja": ["提供"]},
-            "value": {"ja": [v2_manifest["attribution"]]}
-        }
+    v3_manifest = convert_manifest(output.loads(data), v3_base_url)
 
-    # Add rights
-    if "license" in v2_manifest:
-        v3_manifest["rights"] = v2_manifest["license"]
-
-    # Add logo as provider
-    if "logo" in v2_manifest:
-        v3_manifest["provider"] = [{
-            "id": "https://www.hi.u-tokyo.ac.jp/",
-            "type": "Agent",
-            "label": {"ja": ["東京大学史料編纂所"]},
-            "logo": [{
-                "id": v2_manifest["logo"],
-                "type": "Image",
-                "format": "image/x-icon"
-            }]
-        }]
-
-    # Add thumbnail
-    if "thumbnail" in v2_manifest:
-        v3_manifest["thumbnail"] = convert_thumbnail(v2_manifest["thumbnail"])
-
-    # Add viewingDirection
-    if "viewingDirection" in v2_manifest:
-        v3_manifest["viewingDirection"] = v2_manifest["viewingDirection"]
-
-    # Convert sequences to items (canvases)
-    if "sequences" in v2_manifest and v2_manifest["sequences"]:
-        sequence = v2_manifest["sequences"][0]
-        if "canvases" in sequence:
-            v3_manifest["items"] = [
-                convert_canvas(canvas) for canvas in sequence["canvases"]
-            ]
-
-    return v3_manifest
-
-
-def main():
-    # Set paths
-    base_dir = Path(__file__).parent / "docs" / "iiif"
-    v3_dir = base_dir / "3"
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    output.write_bytes(output_path, output.encode(v3_manifest, profile, sort_keys=False), compressions)
 
-    # Get v3 base URL
-    v3_base_url = "https://hi-ut.github.io/dataset/iiif/3"
+    return hashlib.sha256(data).hexdigest()
 
-    # Find all manifest.json files (excluding v3 directory)
-    manifest_files = []
-    for manifest_path in base_dir.rglob("manifest.json"):
+
+def output_settings() -> Dict:
+    return {"version": CONVERTER_VERSION, "profile": output.profile, "compress": sorted(output.compress)}
+
+
+def load_state(state_path: Path) -> Dict:
+    """Hashes of the v2 inputs converted by the last run, if it used this
+    converter version and the same output profile and compression"""
+    if state_path.exists():
+        state = output.load(str(state_path))
+        if all(state.get(key) == value for key, value in output_settings().items()):
+            return state["sources"]
+    return {}
+
+
+def remove_output(output_path: Path):
+    """Delete a v3 manifest, its precompressed siblings and its emptied folder"""
+    for path in [output_path] + [Path(str(output_path) + "." + ext) for ext in output.COMPRESSIONS]:
+        if path.exists():
+            path.unlink()
+    if output_path.parent.exists() and not any(output_path.parent.iterdir()):
+        output_path.parent.rmdir()
+
+
+def find_manifests(base_dir: Path) -> Tuple[List[Path], Set[str]]:
+    """The published v2 manifests (2/<name>) to convert, and the names of
+    the folders the builder writes (<name>). The builder writes 3/<name>
+    itself for those, so their published copies are not converted"""
+    published = []
+    built = set()
+    for manifest_path in sorted(base_dir.rglob("manifest.json")):
+        top = manifest_path.relative_to(base_dir).parts[0]
         # Skip if in v3 directory
-        if "/3/" in str(manifest_path):
+        if top == "3":
             continue
-        manifest_files.append(manifest_path)
+        if top == "2":
+            published.append(manifest_path)
+        else:
+            built.add(manifest_path.parent.name)
+    return [path for path in published if path.parent.name not in built], built
 
-    print(f"Found {len(manifest_files)} manifest files to convert")
 
-    converted_count = 0
-    error_count = 0
+def convert_tree(base_dir: Path, v3_base_url: str, workers: Optional[int] = None,
+                 force: bool = False) -> Dict[str, int]:
+    """Convert the v2 manifests under base_dir to base_dir/3; return the
+    number of converted, unchanged, removed and failed manifests"""
+    v3_dir = base_dir / "3"
+    state_path = v3_dir / STATE_NAME
+
+    manifest_files, built = find_manifests(base_dir)
+    print(f"Found {len(manifest_files)} manifest files to convert ({len(built)} written by the builder)")
+
+    previous = {} if force else load_state(state_path)
+    state = {}
+    pending = []
 
     for manifest_path in manifest_files:
-        try:
-            # Read v2 manifest
-            with open(manifest_path, 'r', encoding='utf-8') as f:
-                v2_manifest = json.load(f)
+        # Get manifest folder name (e.g., nishikie_hi-0001)
+        output_path = v3_dir / manifest_path.parent.name / "manifest.json"
+        key = str(manifest_path.relative_to(base_dir))
 
-            # Get manifest folder name (e.g., nishikie_hi-0001)
-            manifest_folder = manifest_path.parent.name
+        with open(manifest_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        # Skip if the v2 input and the converter are unchanged since the last run
+        if previous.get(key) == digest and output_path.exists():
+            state[key] = digest
+            continue
 
-            # Create output directory
-            output_dir = v3_dir / manifest_folder
-            output_dir.mkdir(parents=True, exist_ok=True)
+        pending.append((key, manifest_path, output_path))
 
-            # Convert manifest
-            v3_manifest = convert_manifest(v2_manifest, v3_base_url)
+    # Remove v3 manifests whose v2 source is gone
+    expected = {manifest_path.parent.name for manifest_path in manifest_files} | built
+    removed_count = 0
+    for output_path in sorted(v3_dir.glob("*/manifest.json")):
+        if output_path.parent.name not in expected:
+            remove_output(output_path)
+            removed_count += 1
 
-            # Write v3 manifest
-            output_path = output_dir / "manifest.json"
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(v3_manifest, f, ensure_ascii=False, indent=4)
+    converted_count = 0
+    error_count = 0
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(convert_file, str(manifest_path), str(output_path), v3_base_url,
+                            output.profile, list(output.compress)): (key, manifest_path)
+            for key, manifest_path, output_path in pending
+        }
+        for future in as_completed(futures):
+            key, manifest_path = futures[future]
+            try:
+                state[key] = future.result()
+            except Exception as e:
+                print(f"Error converting {manifest_path}: {e}")
+                error_count += 1
+                continue
 
             converted_count += 1
             if converted_count % 100 == 0:
                 print(f"Converted {converted_count} manifests...")
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        # Save what was converted, so an interrupted run resumes
+        v3_dir.mkdir(parents=True, exist_ok=True)
+        output.write_bytes(str(state_path), output.encode(dict(output_settings(), sources=state), "pretty"), ())
+
+    return {
+        "converted": converted_count,
+        "unchanged": len(manifest_files) - len(pending),
+        "removed": removed_count,
+        "errors": error_count
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Convert the v2 manifests under docs/iiif to v3")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of conversion processes (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true",
+                        help="convert every manifest, ignoring the saved source hashes")
+    parser.add_argument("--docs", default=str(Path(__file__).parent.parent / "docs"),
+                        help="output root holding iiif/ (default: the repository docs/ directory)")
+    args = parser.parse_args(argv)
+
+    # Set paths
+    base_dir = Path(args.docs) / "iiif"
+
+    # Get v3 base URL
+    v3_base_url = "https://hi-ut.github.io/dataset/iiif/3"
 
-        except Exception as e:
-            print(f"Error converting {manifest_path}: {e}")
-            error_count += 1
+    counts = convert_tree(base_dir, v3_base_url, args.workers, args.force)
 
     print(f"\nConversion complete!")
-    print(f"Successfully converted: {converted_count}")
-    print(f"Errors: {error_count}")
+    print(f"Successfully converted: {counts['converted']}")
+    print(f"Unchanged: {counts['unchanged']}")
+    print(f"Removed: {counts['removed']}")
+    print(f"Errors: {counts['errors']}")
 
 
 if __name__ == "__main__":
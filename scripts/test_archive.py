@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Check that a page archive returns every harvested page unchanged"""
+
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.archive import PageArchive, archive_directory, archive_path
+
+DATA_DIR = Path(__file__).parent.parent / "src" / "nishikie" / "nishikie_yokohama" / "data"
+
+
+def check_archive() -> int:
+    """Archive the pages and read them back; return how many pages"""
+    files = sorted(DATA_DIR.glob("*.html"))
+    assert files
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = archive_path(tmp)
+        archive_directory(str(DATA_DIR), path)
+        archive = PageArchive(path)
+
+        assert len(archive) == len(files)
+        assert archive.names() == [file.stem for file in files]
+
+        # 順次読み出し
+        for (name, html), file in zip(archive, files):
+            assert name == file.stem
+            assert html == file.read_text(encoding="utf-8")
+
+        # ランダムアクセス
+        for file in random.Random(0).sample(files, 20):
+            assert archive.read_bytes(file.stem) == file.read_bytes()
+
+    return len(files)
+
+
+def test_archive():
+    check_archive()
+
+
+def main():
+    print("OK ({} pages)".format(check_archive()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Check the catalog queries against a scan of the records, and its incremental updates"""
+
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import catalog, output, search
+
+COLLECTION = Path(__file__).parent.parent / "docs" / "iiif" / "collection" / "2" / "nishikie_yokohama.json"
+
+
+def scan(records, text):
+    """Records containing every word of text in their label or metadata"""
+    result = []
+    for record in records:
+        values = [search.normalize(v) for v in [record["label"]] + [m["value"] for m in record["metadata"]]]
+        if all(any(run in v for v in values) for run in search.runs(text)):
+            result.append(record["@id"])
+    return result
+
+
+def check_catalog() -> int:
+    """Load a collection into a catalog, query and update it; return how many records"""
+    # コレクションの項目は要約と同じ形（@id, label, license, metadata, thumbnail）
+    records = output.load(str(COLLECTION))["manifests"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = catalog.connect(str(Path(tmp) / "catalog.sqlite"))
+        assert catalog.update(conn, "yokohama", records)["added"] == len(records)
+        assert catalog.update(conn, "yokohama", records)["unchanged"] == len(records)
+
+        rng = random.Random(0)
+        for _ in range(100):
+            record = rng.choice(records)
+            runs = search.runs(rng.choice([record["label"]] + [m["value"] for m in record["metadata"]]))
+            if not runs:
+                continue
+            run = rng.choice(runs)
+            n = rng.randint(1, min(4, len(run)))
+            start = rng.randint(0, len(run) - n)
+            text = run[start:start + n]
+            assert [r["manifest"] for r in catalog.query(conn, text)] == scan(records, text)
+
+        # 変更・削除・並べ替え
+        changed = [dict(r) for r in records[100:]]
+        changed[0] = dict(changed[0], label="変更後の題名")
+        changed.reverse()
+        counts = catalog.update(conn, "yokohama", changed)
+        assert counts == {"added": 0, "updated": 1, "removed": 100, "unchanged": len(changed) - 1}
+        assert [r["manifest"] for r in catalog.query(conn)] == [r["@id"] for r in changed]
+        assert [r["manifest"] for r in catalog.query(conn, "変更後")] == [records[100]["@id"]]
+        assert catalog.query(conn, '"') == []
+        assert records[0]["@id"] not in [r["manifest"] for r in catalog.query(conn, source="yokohama")]
+        assert conn.execute("SELECT count(*) FROM metadata WHERE manifest NOT IN (SELECT id FROM manifests)"
+                            ).fetchone()[0] == 0
+        assert conn.execute("SELECT count(*) FROM manifests_fts").fetchone()[0] == len(changed)
+        conn.close()
+
+    return len(records)
+
+
+def test_catalog():
+    check_catalog()
+
+
+def main():
+    print("OK ({} records)".format(check_catalog()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Check the incremental v2 to v3 manifest conversion: skip, re-convert, delete and version bump"""
+
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+import convert_to_v3
+from convert_to_v3 import convert_manifest, convert_tree
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import output
+
+V2_DIR = Path(__file__).parent.parent / "docs" / "iiif" / "2"
+V3_BASE_URL = "https://hi-ut.github.io/dataset/iiif/3"
+
+
+def copy_manifest(src: Path, dst: Path, label=None):
+    data = output.load(str(src))
+    if label is not None:
+        data["label"] = label
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    output.write_json(data, str(dst))
+
+
+def v3_label(base: Path, name: str) -> str:
+    return output.load(str(base / "3" / name / "manifest.json"))["label"]["ja"][0]
+
+
+def test_convert_manifest():
+    v2 = output.load(str(sorted(V2_DIR.glob("*/manifest.json"))[0]))
+    canvas = v2["sequences"][0]["canvases"][0]
+    first = canvas["images"][0]
+    second = dict(first, **{"@id": first["@id"] + "-2", "resource": dict(first["resource"], **{"@id": "second.jpg"})})
+    canvas["images"].append(second)
+    canvas["thumbnail"] = {}
+    v2.pop("thumbnail")
+    # v2 はラベルに言語付きの値も許す
+    v2["metadata"].append({"label": [{"@value": "Title", "@language": "en"}], "value": "x"})
+
+    v3 = convert_manifest(v2, V3_BASE_URL)
+    annotations = v3["items"][0]["items"][0]["items"]
+    assert [a["id"] for a in annotations] == [first["@id"], second["@id"]]
+    assert [a["body"]["id"] for a in annotations] == [first["resource"]["@id"], "second.jpg"]
+    assert v3["items"][0]["thumbnail"] == []
+    assert "thumbnail" not in v3
+    assert v3["metadata"][-1]["label"] == {"ja": [[{"@value": "Title", "@language": "en"}]]}
+
+
+def test_convert_tree():
+    sources = sorted(V2_DIR.glob("*/manifest.json"))[:3]
+    assert len(sources) == 3
+    names = [path.parent.name for path in sources]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        for path in sources:
+            copy_manifest(path, base / "2" / path.parent.name / "manifest.json")
+        # ビルダーが書くフォルダ（v2 と 3/ の v3）は変換も削除もしない
+        copy_manifest(sources[0], base / names[0] / "manifest.json", "builder")
+        output.write_json({"label": {"ja": ["builder"]}}, str(base / "3" / names[0] / "manifest.json"))
+
+        counts = convert_tree(base, V3_BASE_URL, workers=2)
+        assert counts == {"converted": 2, "unchanged": 0, "removed": 0, "errors": 0}
+        assert v3_label(base, names[0]) == "builder"
+        assert not list((base / "3").rglob("*.tmp"))
+
+        assert convert_tree(base, V3_BASE_URL, workers=2)["unchanged"] == 2
+
+        # 変更したものだけ変換し直し、v2 がなくなったものは削除する
+        copy_manifest(sources[1], base / "2" / names[1] / "manifest.json", "changed")
+        shutil.rmtree(base / "2" / names[2])
+        counts = convert_tree(base, V3_BASE_URL, workers=2)
+        assert counts == {"converted": 1, "unchanged": 0, "removed": 1, "errors": 0}
+        assert v3_label(base, names[1]) == "changed"
+        assert not (base / "3" / names[2]).exists()
+        assert v3_label(base, names[0]) == "builder"
+
+        # 変換器の版や出力形式が変わるとすべて変換し直す
+        version = convert_to_v3.CONVERTER_VERSION
+        convert_to_v3.CONVERTER_VERSION = version + 1
+        try:
+            assert convert_tree(base, V3_BASE_URL, workers=2)["converted"] == 1
+        finally:
+            convert_to_v3.CONVERTER_VERSION = version
+        output.profile = "compact"
+        try:
+            assert convert_tree(base, V3_BASE_URL, workers=2)["converted"] == 1
+            assert b"\n" not in (base / "3" / names[1] / "manifest.json").read_bytes()
+        finally:
+            output.profile = "pretty"
+
+
+def main():
+    test_convert_manifest()
+    test_convert_tree()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
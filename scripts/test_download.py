@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Test the image downloader against a local stand-in HTTP server"""
+
+import os
+import sys
+import tempfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.download import Downloader
+from dataset.images import probe_file
+
+IMAGES_DIR = Path(__file__).parent.parent / "src" / "nishikie" / "nishikie_hi" / "images"
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class FlakyHandler(QuietHandler):
+    """Serves files, answering 503 to the first request for each /flaky path"""
+
+    failed = set()
+
+    def do_GET(self):
+        if self.path.startswith("/flaky") and self.path not in self.failed:
+            self.failed.add(self.path)
+            self.send_error(503)
+            return
+        if self.path.startswith("/flaky"):
+            self.path = self.path.replace("/flaky", "", 1)
+        super().do_GET()
+
+
+class RangeHandler(QuietHandler):
+    """Serves files, honoring "Range: bytes=0-N" with 206 responses"""
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        path = Path(self.translate_path(self.path))
+        if not range_header or not path.is_file():
+            return super().do_GET()
+
+        data = path.read_bytes()
+        end = min(int(range_header.split("-")[1]), len(data) - 1)
+        self.send_response(206)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Range", "bytes 0-{}/{}".format(end, len(data)))
+        self.send_header("Content-Length", str(end + 1))
+        self.end_headers()
+        self.wfile.write(data[:end + 1])
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # probes close the connection once they have the header
+        pass
+
+
+def serve(handler_class, directory):
+    def handler(*args, **kwargs):
+        return handler_class(*args, directory=str(directory), **kwargs)
+
+    server = QuietServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
+
+
+def test_probe():
+    images = sorted(IMAGES_DIR.glob("*.jpg"))[:20]
+
+    for handler_class in (RangeHandler, QuietHandler):
+        server, base = serve(handler_class, IMAGES_DIR)
+        downloader = Downloader(workers=4, backoff=0.01)
+        entries = downloader.probe_all(["{}/{}".format(base, p.name) for p in images])
+        server.shutdown()
+
+        for p in images:
+            expected = probe_file(str(p))
+            entry = entries["{}/{}".format(base, p.name)]
+            assert (entry["width"], entry["height"]) == (expected["width"], expected["height"]), p
+            assert entry["size"] == expected["size"], p
+
+        if handler_class is RangeHandler:
+            assert downloader.bytes <= 4096 * len(images), downloader.bytes
+
+
+def test_download():
+    with tempfile.TemporaryDirectory() as tmp:
+        served = Path(tmp) / "served"
+        out = Path(tmp) / "out"
+        served.mkdir()
+
+        for i in range(50):
+            (served / "{}.jpg".format(i)).write_bytes(os.urandom(1000 + i * 100))
+
+        server, base = serve(FlakyHandler, served)
+
+        jobs = [("{}/{}.jpg".format(base, i), str(out / "{}.jpg".format(i))) for i in range(40)]
+        jobs += [("{}/flaky/{}.jpg".format(base, i), str(out / "{}.jpg".format(i))) for i in range(40, 50)]
+        jobs.append(("{}/missing.jpg".format(base), str(out / "missing.jpg")))
+
+        errors = Downloader(workers=4, backoff=0.01).run(jobs)
+        server.shutdown()
+
+        assert list(errors) == ["{}/missing.jpg".format(base)], errors
+        for i in range(50):
+            name = "{}.jpg".format(i)
+            assert (out / name).read_bytes() == (served / name).read_bytes(), name
+        assert sorted(p.name for p in out.iterdir()) == sorted("{}.jpg".format(i) for i in range(50))
+
+
+def main():
+    test_download()
+    test_probe()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Check that the lxml and bs4 extraction engines agree on every harvested page"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.extract import parse_page
+
+NISHIKIE_DIR = Path(__file__).parent.parent / "src" / "nishikie"
+
+
+def check_engines_agree() -> int:
+    """Compare both engines on every page; return how many pages"""
+    files = sorted(NISHIKIE_DIR.glob("*/data/*.html"))
+    assert files
+
+    mismatches = []
+    for file in files:
+        if parse_page(str(file), "lxml") != parse_page(str(file), "bs4"):
+            mismatches.append(file)
+
+    assert not mismatches, mismatches[:10]
+    return len(files)
+
+
+def test_engines_agree():
+    check_engines_agree()
+
+
+def main():
+    print("OK ({} pages)".format(check_engines_agree()))
+
+
+if __name__ == "__main__":
+    main()
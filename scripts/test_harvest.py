@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Test the SHIPS harvester against a local stand-in server replaying recorded pages"""
+
+import sys
+import tempfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.harvest import Harvester, QUERY_FIELD
+
+RECORDED_DIR = Path(__file__).parent.parent / "src" / "nishikie" / "nishikie_yokohama" / "data"
+
+LIST_PAGE = """<html><body><form action="/ships/shipscontroller" method="post" name="form01">
+<input name="session" type="hidden" value="{}"/>
+<input name="screen" type="hidden" value="list"/>
+</form></body></html>"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves a search result page and the recorded detail pages by nowrec"""
+
+    sessions = set()
+    served = []
+    fail_after = None
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+
+        if params.get("screen") == "disp":
+            with self.lock:
+                if self.fail_after is not None and len(self.served) >= self.fail_after:
+                    # サーバ停止を模擬する
+                    self.send_error(404)
+                    return
+                self.served.append(int(params["nowrec"]))
+
+        if params.get("screen") == "list" and params.get(QUERY_FIELD) == "横浜開港資料館":
+            session = uuid.uuid4().hex
+            self.sessions.add(session)
+            return self.reply(LIST_PAGE.format(session))
+
+        path = RECORDED_DIR / "{}.html".format(params.get("nowrec", "").zfill(4))
+        if params.get("screen") == "disp" and params.get("session") in self.sessions and path.exists():
+            return self.reply(path.read_text(encoding="utf-8"))
+
+        self.send_error(404)
+
+    def reply(self, html):
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve():
+    StandInHandler.sessions = set()
+    StandInHandler.served = []
+    StandInHandler.fail_after = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/ships/shipscontroller".format(server.server_address[1])
+
+
+def assert_same(tmp, indices):
+    for i in indices:
+        name = "{}.html".format(str(i).zfill(4))
+        assert (Path(tmp) / name).read_text() == (RECORDED_DIR / name).read_text(), name
+    assert sorted(p.name for p in Path(tmp).glob("*.html")) == \
+        sorted("{}.html".format(str(i).zfill(4)) for i in indices)
+
+
+def test_harvest():
+    server, base_url = serve()
+    indices = list(range(1, 41)) + [939]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        harvester = Harvester("横浜開港資料館", tmp, base_url=base_url, workers=4, rate=None)
+        errors = harvester.run(indices)
+        server.shutdown()
+
+        assert not errors, errors
+        assert_same(tmp, indices)
+
+    # one search per worker thread plus the main thread
+    assert len(StandInHandler.sessions) <= 5
+
+
+def test_resume():
+    server, base_url = serve()
+    indices = list(range(1, 61))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 25件で中断したクロール
+        StandInHandler.fail_after = 25
+        errors = Harvester("横浜開港資料館", tmp, base_url=base_url, workers=4, rate=None,
+                           retries=0).run(indices)
+        assert len(errors) == 35, len(errors)
+        first_run = set(StandInHandler.served)
+
+        # 取得済みのファイルを1件書き換える
+        changed = sorted(first_run)[-1]
+        (Path(tmp) / "{}.html".format(str(changed).zfill(4))).write_text("edited")
+
+        StandInHandler.fail_after = None
+        StandInHandler.served = []
+        errors = Harvester("横浜開港資料館", tmp, base_url=base_url, workers=4, rate=None).run(indices)
+        server.shutdown()
+
+        assert not errors, errors
+        assert sorted(StandInHandler.served) == sorted(set(indices) - first_run | {changed})
+        assert_same(tmp, indices)
+
+
+def main():
+    test_harvest()
+    test_resume()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Check the perceptual hashes of re-encoded images and the BK-tree lookup against all pairs"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.phash import BKTree, HashIndex, distance, hash_files, near_duplicates
+
+IMAGE_DIR = Path(__file__).parent.parent / "src" / "nishikie" / "nishikie_hi" / "images"
+
+
+def check_hashes() -> int:
+    """Compare the hashes of images and their re-encoded copies; return how many images"""
+    from PIL import Image
+
+    files = sorted(IMAGE_DIR.glob("*.jpg"))[:20]
+    with tempfile.TemporaryDirectory() as tmp:
+        # 縮小・再圧縮した画像は近く、別の画像は遠い
+        copies = []
+        for file in files:
+            with Image.open(file) as im:
+                im = im.convert("RGB")
+                im = im.resize((im.width // 3, im.height // 3))
+                copy = Path(tmp) / file.name
+                im.save(copy, quality=60)
+                copies.append(str(copy))
+
+        original = [h for h in hash_files([str(f) for f in files]) if h]
+        reencoded = [h for h in hash_files(copies) if h]
+        assert len(original) == len(reencoded) > 10
+
+        for a, b in zip(original, reencoded):
+            assert distance(int(a["phash"], 16), int(b["phash"], 16)) <= 6
+            assert distance(int(a["dhash"], 16), int(b["dhash"], 16)) <= 10
+
+        far = [distance(int(a["phash"], 16), int(b["phash"], 16))
+               for a, b in zip(original, original[1:] + original[:1])]
+        assert sum(far) / len(far) > 20
+
+    return len(original)
+
+
+def test_hashes():
+    check_hashes()
+
+
+def test_hash_index():
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {}
+        for file in sorted(IMAGE_DIR.glob("*.jpg"))[:2]:
+            files[file.stem] = shutil.copy(file, tmp)
+        index = HashIndex(str(Path(tmp) / "image_hashes.json"))
+        assert index.update(files, workers=1) == 2
+        index.save()
+
+        index = HashIndex(index.path)
+        assert index.update(files, workers=1) == 0
+        # 同じ大きさで書き換えられた（更新時刻だけが変わった）画像も計算し直す
+        path = next(iter(files.values()))
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert index.update(files, workers=1) == 1
+
+
+def test_bktree():
+    rng = random.Random(0)
+    # 近いものが多い分布（ランダムな中心からの少数ビット反転）
+    centers = [rng.getrandbits(64) for _ in range(50)]
+    values = {}
+    for i in range(600):
+        value = rng.choice(centers)
+        for _ in range(rng.randint(0, 12)):
+            value ^= 1 << rng.randrange(64)
+        values["{:04d}".format(i)] = {"phash": "{:016x}".format(value)}
+
+    names = sorted(values)
+    pairs = sorted((distance(int(values[a]["phash"], 16), int(values[b]["phash"], 16)), a, b)
+                   for i, a in enumerate(names) for b in names[i + 1:])
+    for threshold in (0, 4, 10):
+        assert near_duplicates(values, threshold) == [pair for pair in pairs if pair[0] <= threshold]
+
+    tree = BKTree()
+    assert tree.find(0, 64) == []
+
+
+def main():
+    n = check_hashes()
+    test_hash_index()
+    test_bktree()
+    print("OK ({} images)".format(n))
+
+
+if __name__ == "__main__":
+    main()
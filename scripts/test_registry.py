@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Check call number normalization, collision kinds and per-source replacement of the registry"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.registry import Registry, normalize
+
+
+def test_normalize():
+    assert normalize("Ａｂ１－００－００１") == "Ab1-00-001"
+    assert normalize(" 0380-17-1-(1) ") == normalize("0380‐17‐1‐（1）") == "0380-17-1-(1)"
+    assert normalize("K915 108　01") == "K91510801"
+
+
+def check_registry() -> float:
+    """Check collisions and replacement; return the seconds taken by 200k entries"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "callnumbers.json")
+        registry = Registry(path)
+        registry.replace_source("a", [("X-1", "a/1", "a/1.html"), ("X-1", "a/2", "a/2.html"),
+                                      ("Y-2", "a/3", "a/3.html")])
+        registry.replace_source("b", [("Ｙ－２", "b/1", "b/1.html"), ("Z 3", "b/2", "b/2.html")])
+        registry.save()
+
+        # 別のソースだけを更新しても、他のソースの記録は保存したものから読まれる
+        registry = Registry(path)
+        registry.replace_source("b", [("Ｙ－２", "b/1", "b/1.html"), ("Z3", "b/2", "b/2.html")])
+        report = {c["key"]: c for c in registry.collisions()}
+        assert report["X-1"]["kind"] == "exact" and report["X-1"]["sources"] == ["a"]
+        assert report["Y-2"]["kind"] == "normalized" and report["Y-2"]["sources"] == ["a", "b"]
+        assert "Z3" not in report
+        assert len(registry) == 5
+
+        registry.replace_source("a", [])
+        assert registry.collisions() == []
+
+        # 件数に比例する時間で済むこと
+        n = 200000
+        start = time.perf_counter()
+        registry.replace_source("big", (("C-{}".format(i % (n - 10)), "m", "p") for i in range(n)))
+        assert len(registry.collisions()) == 10
+        return time.perf_counter() - start
+
+
+def test_registry():
+    check_registry()
+
+
+def main():
+    test_normalize()
+    print("OK (200k entries in {:.1f} s)".format(check_registry()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Check that the search index finds every item whose metadata contains a query"""
+
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import search
+from dataset.xlsx import iter_manifests
+
+COLLECTION_DIR = Path(__file__).parent.parent / "docs" / "iiif" / "collection" / "2"
+
+
+def check_search() -> int:
+    """Index the published collections and compare queries with a scan; return how many items"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # 公開済みのコレクションを static_dir/iiif/collection として読む
+        os.makedirs(os.path.join(tmp, "iiif"))
+        os.symlink(COLLECTION_DIR, os.path.join(tmp, "iiif", "collection"))
+        # シャードの区切りを跨ぐ前方一致も試すため小さくする
+        search.build_index(tmp, shard_size=4096)
+
+        texts = []
+        manifests = []
+        for name, entry in iter_manifests(tmp):
+            values = [entry["label"]] + [m["value"] for m in entry.get("metadata", [])]
+            texts.append([search.normalize(value) for value in values])
+            manifests.append(entry["@id"])
+
+        index = search.Index(tmp)
+        rng = random.Random(0)
+        for _ in range(200):
+            runs = search.runs(rng.choice(rng.choice(texts)))
+            if not runs:
+                continue
+            run = rng.choice(runs)
+            n = rng.randint(1, min(4, len(run)))
+            start = rng.randint(0, len(run) - n)
+            query = run[start:start + n]
+
+            expected = {manifests[i] for i, values in enumerate(texts) if any(query in v for v in values)}
+            found = {doc["manifest"] for doc in index.search(query)}
+            # bigram の AND なので3文字以上は余分に当たることがある
+            assert expected <= found
+            if n <= search.NGRAM:
+                assert expected == found
+
+        assert index.search("zzzzqqqq") == []
+
+    return len(manifests)
+
+
+def test_search():
+    check_search()
+
+
+def main():
+    print("OK ({} items)".format(check_search()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Check that streaming a collection's array yields the same entries as loading the file"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset import output
+
+COLLECTION_DIR = Path(__file__).parent.parent / "docs" / "iiif" / "collection" / "2"
+
+
+def check_iter_array() -> int:
+    """Stream every published collection; return how many entries were compared"""
+    files = sorted(COLLECTION_DIR.glob("*.json"))
+    assert files
+
+    n = 0
+    for file in files:
+        data = output.load(str(file))
+        key = "collections" if "collections" in data else "manifests"
+        # チャンクの境目が要素・文字列・数値の途中に来ても同じ結果になること
+        for chunk_size in (61, 4096):
+            assert list(output.iter_array(str(file), ("collections", "manifests"), chunk_size)) == data[key]
+        assert list(output.iter_array(str(file), "missing")) == []
+        n += len(data[key])
+
+    # 整形なしのファイルと数値
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "compact.json"
+        data = {"label": "a", "n": [1], "manifests": [{"width": 12345, "height": 1e5}, -0.25, "x,]"]}
+        path.write_text(json.dumps(data, separators=(',', ':')))
+        for chunk_size in range(1, 12):
+            assert list(output.iter_array(str(path), "manifests", chunk_size)) == data["manifests"]
+
+    return n
+
+
+def test_iter_array():
+    check_iter_array()
+
+
+def main():
+    print("OK ({} entries)".format(check_iter_array()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Check that thumbnails are written at the recorded size and used by the manifest model"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+from dataset.images import url_key
+from dataset.model import Image, Item, manifest_v2, manifest_v3
+from dataset.thumbnails import Thumbnails
+
+IMAGE_DIR = Path(__file__).parent.parent / "src" / "nishikie" / "nishikie_hi" / "images"
+BASE_URI = "https://hi-ut.github.io/dataset"
+
+
+def check_thumbnails() -> int:
+    """Write thumbnails and use them in a manifest; return how many were written"""
+    from PIL import Image as PILImage
+
+    files = {file.stem: str(file) for file in sorted(IMAGE_DIR.glob("*.jpg"))[:8]}
+    assert files
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 画像でないファイルは数えず、書きかけのファイルも残さない
+        broken = Path(tmp) / "broken.jpg"
+        broken.write_text("<html></html>")
+        thumbnails = Thumbnails(tmp, BASE_URI)
+        written = thumbnails.update(dict(files, broken=str(broken)), 120, workers=1)
+        assert written == len(files)
+        assert "broken" not in thumbnails.entries
+        assert not list(Path(thumbnails.dir).glob("*.tmp"))
+        thumbnails.save()
+
+        # 保存した索引から読み直すと作り直さない
+        thumbnails = Thumbnails(tmp, BASE_URI)
+        assert thumbnails.update(files, 120, workers=1) == 0
+
+        for key, entry in thumbnails.entries.items():
+            with PILImage.open(thumbnails.file(key)) as im:
+                assert im.size == (entry["width"], entry["height"])
+                assert max(im.size) == 120
+
+        # thumbnails.get は画像の URL で引く（ファイル名は URL の md5）
+        key = next(iter(thumbnails.entries))
+        url = "https://clioimg.hi.u-tokyo.ac.jp/viewer/image/example.jpg"
+        thumbnails.entries[url_key(url)] = thumbnails.entries[key]
+
+        item = Item(BASE_URI + "/iiif/test-0001/manifest.json", "test", ())
+        item.add_image(Image(url, 1000, 1500), thumbnails.get(url))
+        v2 = manifest_v2(item)
+        assert v2["thumbnail"]["@id"] == "{}/thumbnails/{}.jpg".format(BASE_URI, url_key(url))
+        assert v2["sequences"][0]["canvases"][0]["thumbnail"] == v2["thumbnail"]
+        assert v2["sequences"][0]["canvases"][0]["images"][0]["resource"]["@id"] == url
+        v3 = manifest_v3(item, BASE_URI + "/iiif/3/test-0001/manifest.json")
+        assert v3["thumbnail"][0]["width"] == thumbnails.entries[key]["width"]
+
+    return written
+
+
+def test_thumbnails():
+    check_thumbnails()
+
+
+def main():
+    print("OK ({} thumbnails)".format(check_thumbnails()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,9 @@
-import sys
-import bs4
-import hashlib
-import json
-import bs4
-import requests
-import time
-import os
-import urllib.parse
-import csv
 import glob
-from rdflib import URIRef, BNode, Literal, Graph
-from rdflib.namespace import RDF, RDFS, FOAF, XSD
-from rdflib import Namespace
-import pandas as pd
-import uuid
-import bs4
-import hashlib
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from dataset import output
 
 prefix0 = "https://hi-nishikie.web.app"
 static_dir = "../../static"
@@ -30,10 +18,10 @@ for file in files:
     if "top.json" in file:
         continue
 
-    json_open = open(file, 'r')
-    df = json.load(json_open)
+    df = output.load(file)
 
-    del df["manifests"]
+    # ページ分割されたコレクションには manifests がない
+    df.pop("manifests", None)
     del df["@context"]
 
     collections.append(df)
@@ -47,6 +35,4 @@ collection = {
 }
 
 f_path = collection["@id"].replace(prefix0, static_dir)
-with open(f_path, 'w') as outfile:
-    json.dump(collection, outfile, ensure_ascii=False,
-                indent=4, sort_keys=True, separators=(',', ': '))
\ No newline at end of file
+output.write_json(collection, f_path)
\ No newline at end of file
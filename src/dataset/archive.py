@@ -0,0 +1,152 @@
+"""
+Compressed page archive
+Stores the harvested data/NNNN.html pages of a source in one file, each page
+compressed as its own gzip member (or zstd frame), with a JSON offset index
+keyed by record number for random access and streaming iteration
+"""
+
+import gzip
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+CODECS = ("gzip", "zstd")
+
+EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def _compressor(codec: str):
+    if codec == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=19).compress
+    raise ValueError("unknown codec: {}".format(codec))
+
+
+def _decompressor(codec: str):
+    if codec == "gzip":
+        return gzip.decompress
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError("unknown codec: {}".format(codec))
+
+
+def archive_path(directory: str, codec: str = "gzip") -> str:
+    return os.path.join(directory, "data.pages" + EXTENSIONS[codec])
+
+
+def find_archive(directory: str) -> str:
+    """Return the archive of a source directory, whichever codec it uses"""
+    for codec in CODECS:
+        path = archive_path(directory, codec)
+        if os.path.exists(path + ".index.json"):
+            return path
+    raise FileNotFoundError("no page archive in {}".format(directory))
+
+
+def write_archive(path: str, pages: Iterable[Tuple[str, bytes]], codec: str = "gzip") -> Dict:
+    """Write (name, data) pairs to path and its index; return the index"""
+    compress = _compressor(codec)
+    records = []
+    offset = 0
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        for name, data in pages:
+            frame = compress(data)
+            f.write(frame)
+            records.append({
+                "name": name,
+                "offset": offset,
+                "length": len(frame),
+                "size": len(data)
+            })
+            offset += len(frame)
+
+    index = {
+        "codec": codec,
+        "records": records
+    }
+
+    with open(path + ".index.json.tmp", 'w', encoding='utf-8') as outfile:
+        json.dump(index, outfile, ensure_ascii=False,
+                indent=4, sort_keys=True, separators=(',', ': '))
+    os.replace(tmp_path, path)
+    os.replace(path + ".index.json.tmp", path + ".index.json")
+
+    return index
+
+
+def archive_directory(data_dir: str, path: str, codec: str = "gzip") -> Dict:
+    """Archive every data_dir/*.html, keyed by file stem (record number)"""
+    names = sorted(name for name in os.listdir(data_dir) if name.endswith(".html"))
+
+    def pages():
+        for name in names:
+            with open(os.path.join(data_dir, name), 'rb') as f:
+                yield os.path.splitext(name)[0], f.read()
+
+    return write_archive(path, pages(), codec)
+
+
+# (archive path, codec, offset, length) of one page
+Span = Tuple[str, str, int, int]
+
+
+def read_span(span: Span) -> str:
+    """Read one page straight from the archive file, without loading the index
+    (for worker processes given spans by PageArchive.spans)"""
+    path, codec, offset, length = span
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return _decompressor(codec)(f.read(length)).decode("utf-8")
+
+
+class PageArchive:
+    """Read access to an archive written by write_archive"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path + ".index.json", 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+        self.codec = index["codec"]
+        self.records: List[Dict] = index["records"]
+        self.by_name = {record["name"]: record for record in self.records}
+        self._decompress = _decompressor(self.codec)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def names(self) -> List[str]:
+        return [record["name"] for record in self.records]
+
+    def read_bytes(self, name: str) -> bytes:
+        """Random access to one page by record number, e.g. "0001" """
+        record = self.by_name[name]
+        with open(self.path, 'rb') as f:
+            f.seek(record["offset"])
+            return self._decompress(f.read(record["length"]))
+
+    def spans(self) -> List[Span]:
+        """Where each page is stored, in archive order"""
+        return [(self.path, self.codec, record["offset"], record["length"]) for record in self.records]
+
+    def read(self, name: str) -> str:
+        return self.read_bytes(name).decode("utf-8")
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        """Stream (name, html) pairs in archive order with one open file"""
+        with open(self.path, 'rb') as f:
+            for record in self.records:
+                f.seek(record["offset"])
+                yield record["name"], self._decompress(f.read(record["length"])).decode("utf-8")
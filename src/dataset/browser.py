@@ -0,0 +1,214 @@
+"""
+Sharded headless-browser crawl of the SHIPS nishikie database
+Splits the search result into ranges of list pages and walks each range in
+its own headless Chrome, moving on as soon as the detail table has changed
+instead of sleeping a fixed time per record
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+from .harvest import CHECKPOINT_NAME, Checkpoint, Harvester, record_position
+
+TOP_URL = "https://wwwap.hi.u-tokyo.ac.jp/ships/shipscontroller"
+
+# 一覧画面の1ページあたりの件数（form01 の lmax）
+PAGE_SIZE = 20
+
+
+def new_driver():
+    from selenium import webdriver
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    return webdriver.Chrome(options=options)
+
+
+def res_tbl_text(driver) -> str:
+    from selenium.webdriver.common.by import By
+
+    return driver.find_element(By.CLASS_NAME, "res_tbl").text
+
+
+def click_and_wait(driver, element, timeout: float):
+    """Click element, then wait until the res_tbl cell (n/total件) has changed"""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    try:
+        old_text = res_tbl_text(driver)
+    except Exception:
+        old_text = None
+
+    element.click()
+
+    def changed(d):
+        try:
+            return res_tbl_text(d) != old_text
+        except Exception:
+            return False
+
+    WebDriverWait(driver, timeout, poll_frequency=0.05).until(changed)
+
+
+def open_search(driver, query: str, timeout: float):
+    """Run the search in the browser and stay on the first result list page"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.select import Select
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    wait = WebDriverWait(driver, timeout)
+
+    driver.get(TOP_URL)
+    wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "錦絵データベース"))).click()
+
+    Select(wait.until(EC.presence_of_element_located((By.NAME, "nitem01")))).select_by_value("item06")
+    driver.find_element(By.NAME, "nterm01_1").send_keys(query)
+    driver.find_element(By.CLASS_NAME, "btn85").click()
+
+    wait.until(EC.presence_of_element_located((By.LINK_TEXT, "詳細")))
+
+
+def goto_list_page(driver, page: int, timeout: float):
+    """Click through the pager links until list page `page` is shown"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    current = 1
+    while current != page:
+        links = {}
+        for a in driver.find_elements(By.TAG_NAME, "a"):
+            text = a.text.strip()
+            if text.isdigit():
+                links[int(text)] = a
+
+        # 表示されているページ番号のうち、目的のページに最も近いものへ進む
+        reachable = [n for n in links if current < n <= page]
+        if not reachable:
+            raise RuntimeError("list page {} is not reachable from page {}".format(page, current))
+        target = max(reachable)
+
+        first_detail = driver.find_element(By.LINK_TEXT, "詳細")
+        links[target].click()
+        WebDriverWait(driver, timeout).until(EC.staleness_of(first_detail))
+        current = target
+
+
+def page_ranges(total: int, shards: int) -> List[Tuple[int, int]]:
+    """Split records 1..total into at most `shards` ranges aligned to list pages"""
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    per_shard = (pages + shards - 1) // shards
+
+    ranges = []
+    for first_page in range(1, pages + 1, per_shard):
+        last_page = min(first_page + per_shard - 1, pages)
+        ranges.append(((first_page - 1) * PAGE_SIZE + 1, min(last_page * PAGE_SIZE, total)))
+    return ranges
+
+
+class BrowserCrawler:
+    """Crawls record ranges in parallel, one headless Chrome per range"""
+
+    def __init__(self, query: str, data_dir: str, shards: int = 4, timeout: float = 30.0):
+        self.query = query
+        self.shards = shards
+        self.timeout = timeout
+        # 保存とチェックポイントは HTTP 版と共通
+        self.writer = Harvester(query, data_dir)
+        self.checkpoint = Checkpoint(os.path.join(data_dir, CHECKPOINT_NAME), query)
+        self._lock = threading.Lock()
+
+    def count(self) -> int:
+        """Open the first detail record to read the total number of records"""
+        from selenium.webdriver.common.by import By
+
+        driver = new_driver()
+        try:
+            open_search(driver, self.query, self.timeout)
+            click_and_wait(driver, driver.find_element(By.LINK_TEXT, "詳細"), self.timeout)
+            return record_position(driver.page_source)[1]
+        finally:
+            driver.quit()
+
+    def crawl(self, worker: int, first: int, last: int, done: Set[int] = frozenset()) -> Dict:
+        """Save records first..last (1-based, inclusive) in one browser,
+        passing over those in done"""
+        from selenium.webdriver.common.by import By
+
+        driver = new_driver()
+        start = time.time()
+        saved = 0
+        try:
+            open_search(driver, self.query, self.timeout)
+            goto_list_page(driver, (first - 1) // PAGE_SIZE + 1, self.timeout)
+            # 一覧ページの first の行から詳細を開く
+            details = driver.find_elements(By.LINK_TEXT, "詳細")
+            click_and_wait(driver, details[(first - 1) % PAGE_SIZE], self.timeout)
+
+            while True:
+                html = driver.page_source
+                # res_tbl の番号（n/総数件）をそのままファイル番号にする
+                index, _ = record_position(html)
+                if index not in done:
+                    digest = self.writer.save(index, html)
+                    with self._lock:
+                        self.checkpoint.mark(index, digest)
+                    saved += 1
+
+                if index >= last:
+                    break
+
+                # 次　件
+                click_and_wait(driver, driver.find_elements(By.CLASS_NAME, "btn85")[1], self.timeout)
+        finally:
+            driver.quit()
+
+        elapsed = time.time() - start
+        print("worker {}: records {}-{}, {} saved in {:.1f}s, {:.2f} records/s".format(
+            worker, first, last, saved, elapsed, saved / elapsed if elapsed else 0.0))
+        return {"worker": worker, "first": first, "last": last, "saved": saved, "seconds": elapsed}
+
+    def run(self, restart: bool = False) -> List[Dict]:
+        """Crawl every record. Records saved by an earlier run (of either
+        crawler) and unchanged on disk are skipped unless restart is set"""
+        if restart:
+            self.checkpoint.saved = {}
+            self.checkpoint.last = 0
+
+        total = self.checkpoint.total or self.count()
+        self.checkpoint.total = total
+
+        done = {i for i in range(1, total + 1) if self.checkpoint.is_saved(i, self.writer.path(i))}
+        if done:
+            print("resuming after record {}: {} records already saved".format(self.checkpoint.last, len(done)))
+
+        # 各範囲の未取得の最初から最後までを歩く（途中の取得済みは保存しない）
+        ranges = []
+        for first, last in page_ranges(total, self.shards):
+            pending = [i for i in range(first, last + 1) if i not in done]
+            if pending:
+                ranges.append((pending[0], pending[-1]))
+
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(ranges))) as executor:
+                futures = [executor.submit(self.crawl, i + 1, first, last, done)
+                           for i, (first, last) in enumerate(ranges)]
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        print("worker failed: {}".format(e))
+        finally:
+            self.checkpoint.save()
+
+        saved = sum(r["saved"] for r in results)
+        seconds = max((r["seconds"] for r in results), default=0.0)
+        print("{} workers saved {} of {} records ({} skipped) in {:.1f}s, {:.2f} records/s".format(
+            len(ranges), saved, total, len(done), seconds, saved / seconds if seconds else 0.0))
+        return results
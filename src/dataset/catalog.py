@@ -0,0 +1,172 @@
+"""
+SQLite catalog of the manifests
+One row per manifest written by the manifests command, its metadata as
+(label, value) rows and an FTS5 index, so that questions like "all items by
+国芳 from Yokohama" are one query instead of a scan of every manifest.json.
+
+The catalog lives next to the summaries (iiif/summary/catalog.sqlite, kept
+out of git and so not published) and is updated from the same records after each manifests run: a manifest whose
+summary changed is replaced, a new one inserted, and the manifests of the
+source that were not written again are deleted.
+
+SQLite's tokenizers do not split Japanese text (unicode61) or need three
+characters (trigram), so the FTS columns hold the character bigrams of
+each word in order, followed by its last character (as in dataset.search).
+A query word is matched as a phrase of its bigrams and a one-character
+word as a prefix
+"""
+
+import hashlib
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+from . import output
+from .search import NGRAM, runs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifests (
+    id INTEGER PRIMARY KEY,
+    uri TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    license TEXT,
+    thumbnail TEXT,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS manifests_source ON manifests (source, position);
+CREATE TABLE IF NOT EXISTS metadata (
+    manifest INTEGER NOT NULL REFERENCES manifests (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (manifest, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metadata_label ON metadata (label, value);
+CREATE VIRTUAL TABLE IF NOT EXISTS manifests_fts USING fts5 (label, metadata);
+"""
+
+
+def catalog_path(static_dir: str) -> str:
+    return os.path.join(static_dir, "iiif", "summary", "catalog.sqlite")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def bigrams(run: str) -> List[str]:
+    return [run[i:i + NGRAM] for i in range(len(run) - NGRAM + 1)]
+
+
+def ngrams(text: str) -> str:
+    """FTS text of a value: the bigrams and the last character of each word.
+    The last character also keeps the bigrams of two words from matching as one phrase"""
+    return "\n".join(" ".join(bigrams(run) + [run[-1]]) for run in runs(text))
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query matching every word of query as a substring"""
+    terms = []
+    for run in runs(query):
+        if len(run) < NGRAM:
+            terms.append('"{}"*'.format(run))
+        else:
+            terms.append('"{}"'.format(" ".join(bigrams(run))))
+    return " AND ".join(terms)
+
+
+def record_hash(record: Dict) -> str:
+    return hashlib.sha1(output.encode(record, "compact")).hexdigest()
+
+
+def update(conn: sqlite3.Connection, source: str, records: Iterable[Dict]) -> Dict[str, int]:
+    """Bring the catalog rows of source in line with its summary records
+    (in manifest order); return the number of added, updated, removed and
+    unchanged manifests"""
+    counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+
+    with conn:
+        known = {uri: (id, hash, position) for id, uri, hash, position in conn.execute(
+            "SELECT id, uri, hash, position FROM manifests WHERE source = ?", (source,))}
+        seen = set()
+
+        for position, record in enumerate(records):
+            uri = record["@id"]
+            seen.add(uri)
+            digest = record_hash(record)
+
+            thumbnail = record.get("thumbnail")
+            row = (position, record["label"], record.get("license"),
+                   thumbnail["@id"] if thumbnail else None, digest)
+
+            if uri in known:
+                id, old_hash, old_position = known[uri]
+                if old_hash == digest:
+                    if old_position != position:
+                        conn.execute("UPDATE manifests SET position = ? WHERE id = ?", (position, id))
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated"] += 1
+                conn.execute("UPDATE manifests SET position = ?, label = ?, license = ?, thumbnail = ?, hash = ?"
+                             " WHERE id = ?", row + (id,))
+                # 子の行は付け直す
+                conn.execute("DELETE FROM metadata WHERE manifest = ?", (id,))
+                conn.execute("DELETE FROM manifests_fts WHERE rowid = ?", (id,))
+            else:
+                counts["added"] += 1
+                id = conn.execute("INSERT INTO manifests (uri, source, position, label, license, thumbnail, hash)"
+                                  " VALUES (?, ?, ?, ?, ?, ?, ?)", (uri, source) + row).lastrowid
+
+            metadata = record.get("metadata") or []
+            conn.executemany("INSERT INTO metadata (manifest, position, label, value) VALUES (?, ?, ?, ?)",
+                             [(id, i, m["label"], m["value"]) for i, m in enumerate(metadata)])
+            conn.execute("INSERT INTO manifests_fts (rowid, label, metadata) VALUES (?, ?, ?)",
+                         (id, ngrams(record["label"]), "\n".join(ngrams(m["value"]) for m in metadata)))
+
+        removed = [id for uri, (id, _, _) in known.items() if uri not in seen]
+        conn.executemany("DELETE FROM manifests_fts WHERE rowid = ?", [(id,) for id in removed])
+        conn.executemany("DELETE FROM manifests WHERE id = ?", [(id,) for id in removed])
+        counts["removed"] = len(removed)
+
+    return counts
+
+
+def query(conn: sqlite3.Connection, text: Optional[str] = None, source: Optional[str] = None,
+          fields: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """Manifests whose label or metadata contain every word of text, optionally
+    limited to a source and to metadata fields containing a value
+    ({"画工名": "国芳"}), in source and manifest order"""
+    sql = "SELECT m.uri, m.source, m.label FROM manifests m"
+    where = []
+    params: List = []
+
+    if text:
+        expression = match_expression(text)
+        if not expression:
+            # 語のない検索語（記号だけなど）には何も一致しない
+            return []
+        sql += " JOIN manifests_fts f ON f.rowid = m.id"
+        where.append("manifests_fts MATCH ?")
+        params.append(expression)
+
+    if source:
+        where.append("m.source = ?")
+        params.append(source)
+
+    for label, value in (fields or {}).items():
+        where.append("EXISTS (SELECT 1 FROM metadata d WHERE d.manifest = m.id AND d.label = ?"
+                     " AND instr(d.value, ?) > 0)")
+        params += [label, value]
+
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY m.source, m.position"
+
+    return [{"manifest": uri, "source": source, "label": label}
+            for uri, source, label in conn.execute(sql, params)]
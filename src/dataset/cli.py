@@ -0,0 +1,350 @@
+"""
+dataset command line interface
+Each subcommand imports only the modules it needs, when it runs, so that
+`dataset --help` and small rebuilds start quickly
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+
+# keep in sync with dataset.extract.ENGINES (not imported here to stay fast)
+ENGINES = ("lxml", "bs4")
+
+
+def run_script(path: str, argv: List[str]):
+    """Run a standalone script from its own directory, as the scripts expect"""
+    import runpy
+
+    cwd = os.getcwd()
+    saved_argv = sys.argv
+    os.chdir(os.path.dirname(path))
+    sys.argv = [path] + argv
+    try:
+        runpy.run_path(path, run_name="__main__")
+    finally:
+        os.chdir(cwd)
+        sys.argv = saved_argv
+
+
+def select_sources(names: Optional[List[str]]):
+    from .pipeline import SOURCES, get_source
+
+    try:
+        return [get_source(name) for name in names] if names else SOURCES
+    except KeyError as e:
+        sys.exit("dataset: {}".format(e.args[0]))
+
+
+def cmd_scrape(args):
+    from .pipeline import source_dir
+
+    for source in select_sources(args.source):
+        if args.selenium:
+            run_script(os.path.join(source_dir(source), source["scraper"]), [])
+            continue
+
+        if args.browsers:
+            from .browser import BrowserCrawler
+
+            BrowserCrawler(source["query"], os.path.join(source_dir(source), "data"),
+                           shards=args.browsers).run(restart=args.restart)
+            continue
+
+        from .harvest import BASE_URL, Harvester
+
+        harvester = Harvester(source["query"], os.path.join(source_dir(source), "data"),
+                              base_url=args.base_url or BASE_URL,
+                              workers=args.workers, rate=args.rate)
+        harvester.run(restart=args.restart)
+
+
+def cmd_archive(args):
+    from .archive import archive_directory, archive_path
+    from .pipeline import source_dir
+
+    for source in select_sources(args.source):
+        data_dir = os.path.join(source_dir(source), "data")
+        path = archive_path(source_dir(source), args.codec)
+        index = archive_directory(data_dir, path, args.codec)
+
+        size = sum(record["size"] for record in index["records"])
+        length = sum(record["length"] for record in index["records"])
+        print("{}: {} pages, {:.1f} MB -> {:.1f} MB ({})".format(
+            source["name"], len(index["records"]), size / 1e6, length / 1e6, os.path.basename(path)))
+
+
+def cmd_manifests(args):
+    from .pipeline import create_manifests
+
+    create_manifests(select_sources(args.source), args.workers, args.engine, args.probe,
+                     args.from_archive)
+
+
+def cmd_collections(args):
+    from .pipeline import create_collection
+
+    for source in select_sources(args.source):
+        create_collection(source, args.page_size)
+
+
+def cmd_convert_v3(args):
+    from . import pipeline
+
+    sys.path.append(os.path.join(ROOT_DIR, "scripts"))
+    docs = ["--docs", pipeline.static_dir]
+
+    if args.target in ("manifests", "all"):
+        import convert_to_v3
+        argv = docs + (["--force"] if args.force else [])
+        if args.workers:
+            argv += ["--workers", str(args.workers)]
+        convert_to_v3.main(argv)
+
+    if args.target in ("collections", "all"):
+        import convert_collection_to_v3
+        convert_collection_to_v3.main(docs)
+
+
+def cmd_reformat(args):
+    from . import output, pipeline
+
+    root = os.path.join(pipeline.static_dir, "iiif")
+    totals = output.rewrite_tree(root, output.profile, output.compress)
+
+    def mb(n):
+        return "{:.1f} MB".format(n / 1e6)
+
+    for total in totals + [{
+        "tree": "total",
+        "files": sum(t["files"] for t in totals),
+        "before": sum(t["before"] for t in totals),
+        "after": sum(t["after"] for t in totals),
+        **{ext: sum(t[ext] for t in totals) for ext in output.compress}
+    }]:
+        line = "{}: {} files, {} -> {}".format(total["tree"], total["files"], mb(total["before"]), mb(total["after"]))
+        if output.compress:
+            line += " ({})".format(", ".join("{} {}".format(ext, mb(total[ext])) for ext in output.compress))
+        print(line)
+
+
+def cmd_xlsx(args):
+    from . import pipeline, xlsx
+
+    xlsx.export_all(pipeline.static_dir, args.workers)
+
+
+def cmd_table(args):
+    from . import columnar, pipeline
+
+    columnar.export(pipeline.static_dir, args.format)
+
+
+def cmd_search_index(args):
+    from . import pipeline, search
+
+    search.build_index(pipeline.static_dir)
+
+
+def cmd_search(args):
+    from . import pipeline, search
+
+    results = search.Index(pipeline.static_dir).search(" ".join(args.query))
+    for doc in results:
+        print("{}\t{}\t{}".format(doc["collection"], doc["label"], doc["manifest"]))
+    print("{} items".format(len(results)))
+
+
+def cmd_catalog(args):
+    from . import catalog, pipeline
+
+    conn = catalog.connect(catalog.catalog_path(pipeline.static_dir))
+    for source in select_sources(args.source):
+        pipeline.update_catalog(conn, source)
+    conn.close()
+
+
+def cmd_query(args):
+    from . import catalog, pipeline
+
+    fields = {}
+    for field in args.field:
+        label, _, value = field.partition("=")
+        fields[label] = value
+
+    conn = catalog.connect(catalog.catalog_path(pipeline.static_dir))
+    results = catalog.query(conn, " ".join(args.query), args.source, fields)
+    for row in results:
+        print("{}\t{}\t{}".format(row["source"], row["label"], row["manifest"]))
+    print("{} items".format(len(results)))
+
+
+def cmd_callnumbers(args):
+    from . import pipeline, registry
+
+    path = registry.registry_path(pipeline.static_dir)
+    if not os.path.exists(path):
+        sys.exit("dataset: no call number registry at {} (run dataset manifests)".format(path))
+    registry.write_report(registry.Registry(path), registry.report_path(pipeline.static_dir))
+
+
+def cmd_duplicates(args):
+    from .pipeline import find_duplicate_images
+
+    find_duplicate_images(select_sources(args.source), args.workers, args.threshold)
+
+
+def cmd_thumbnails(args):
+    from .pipeline import create_thumbnails
+
+    create_thumbnails(select_sources(args.source), args.workers, args.size)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="dataset",
+                                     description="Build the hi-ut dataset IIIF resources")
+    parser.add_argument("--docs", default=None,
+                        help="output root for manifests and collections instead of the repository docs/ directory")
+    parser.add_argument("--profile", choices=("pretty", "compact"), default="pretty",
+                        help="JSON output: indented and key-sorted (default) or minified")
+    parser.add_argument("--compress", action="append", choices=("gz", "br"), default=[],
+                        help="also write precompressed .gz / .br siblings of every JSON file "
+                             "(repeatable; br needs the brotli package)")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.required = True
+
+    def add_source(p):
+        p.add_argument("--source", action="append",
+                       help="source to process, as named in dataset.pipeline.SOURCES "
+                            "(repeatable; default: all sources)")
+
+    p = subparsers.add_parser("scrape", help="harvest the SHIPS detail pages into data/*.html")
+    add_source(p)
+    p.add_argument("--workers", type=int, default=4,
+                   help="concurrent HTTP requests (default: 4)")
+    p.add_argument("--rate", type=float, default=2.0,
+                   help="maximum requests per second (default: 2; 0 for no limit)")
+    p.add_argument("--base-url", default=None,
+                   help="shipscontroller URL, e.g. a local stand-in server")
+    p.add_argument("--restart", action="store_true",
+                   help="ignore data/checkpoint.json and fetch every record again")
+    p.add_argument("--browsers", type=int, default=0,
+                   help="crawl with this many parallel headless Chrome workers, one range of records each")
+    p.add_argument("--selenium", action="store_true",
+                   help="drive Chrome with the source's Selenium script instead")
+    p.set_defaults(func=cmd_scrape)
+
+    p = subparsers.add_parser("archive", help="pack data/*.html into one compressed, indexed page archive")
+    add_source(p)
+    p.add_argument("--codec", choices=("gzip", "zstd"), default="gzip",
+                   help="compression of each page (zstd needs the zstandard package)")
+    p.set_defaults(func=cmd_archive)
+
+    p = subparsers.add_parser("manifests", help="build the IIIF v2 and v3 manifests")
+    add_source(p)
+    p.add_argument("--probe", action="store_true",
+                   help="read image sizes from the JPEG header with HTTP range requests instead of downloading the images")
+    p.add_argument("--workers", type=int, default=None,
+                   help="number of processes used to parse data/*.html (default: number of CPUs)")
+    p.add_argument("--engine", choices=ENGINES, default="lxml",
+                   help="HTML extraction engine")
+    p.add_argument("--from-archive", action="store_true",
+                   help="read the pages from the source's page archive instead of data/*.html")
+    p.set_defaults(func=cmd_manifests)
+
+    p = subparsers.add_parser("collections", help="build the per-source IIIF v2 collections")
+    add_source(p)
+    p.add_argument("--page-size", type=int, default=None,
+                   help="split collections larger than this into linked pages of this many manifests "
+                        "(v2 first/next paging; v3 nested collections)")
+    p.set_defaults(func=cmd_collections)
+
+    p = subparsers.add_parser("convert-v3", help="convert the v2 collections to v3, and migrate v2 manifests "
+                                                  "not written by the manifests command")
+    p.add_argument("target", nargs="?", choices=("manifests", "collections", "all"), default="all")
+    p.add_argument("--workers", type=int, default=None,
+                   help="number of processes converting manifests (default: number of CPUs)")
+    p.add_argument("--force", action="store_true",
+                   help="convert every manifest, not only those whose v2 file changed")
+    p.set_defaults(func=cmd_convert_v3)
+
+    p = subparsers.add_parser("reformat", help="rewrite every JSON file under docs/iiif in the --profile / --compress "
+                                                "output and report the byte totals per tree")
+    p.set_defaults(func=cmd_reformat)
+
+    p = subparsers.add_parser("xlsx", help="export collection metadata to docs/iiif/metadata/*.xlsx")
+    p.add_argument("--workers", type=int, default=None,
+                   help="number of processes exporting collections (default: number of CPUs)")
+    p.set_defaults(func=cmd_xlsx)
+
+    p = subparsers.add_parser("table", help="export the metadata of every manifest to one Parquet or Feather "
+                                            "table, docs/iiif/metadata/items.*")
+    p.add_argument("--format", choices=("parquet", "feather"), default="parquet",
+                   help="Parquet (default) or Feather / Arrow IPC; needs the pyarrow package")
+    p.set_defaults(func=cmd_table)
+
+    p = subparsers.add_parser("search-index", help="build the static full-text search index of the collection "
+                                                   "metadata under docs/search")
+    p.set_defaults(func=cmd_search_index)
+
+    p = subparsers.add_parser("search", help="query the search index (items matching every word)")
+    p.add_argument("query", nargs="+")
+    p.set_defaults(func=cmd_search)
+
+    p = subparsers.add_parser("catalog", help="sync the SQLite catalog (iiif/summary/catalog.sqlite) with the "
+                                              "manifests; the manifests command also does this")
+    add_source(p)
+    p.set_defaults(func=cmd_catalog)
+
+    p = subparsers.add_parser("query", help="query the SQLite catalog (items matching every word)")
+    p.add_argument("query", nargs="*")
+    p.add_argument("--source", help="only items of this source")
+    p.add_argument("--field", action="append", default=[], metavar="LABEL=VALUE",
+                   help="only items whose metadata field contains the value, e.g. 画工名=国芳 (repeatable)")
+    p.set_defaults(func=cmd_query)
+
+    p = subparsers.add_parser("callnumbers", help="report call numbers shared by several manifests, across "
+                                                  "sources and after width / whitespace normalization")
+    p.set_defaults(func=cmd_callnumbers)
+
+    p = subparsers.add_parser("duplicates", help="hash the downloaded images (image_hashes.json next to the image "
+                                                 "index) and report near-duplicate prints")
+    add_source(p)
+    p.add_argument("--workers", type=int, default=None,
+                   help="number of processes hashing images (default: number of CPUs)")
+    p.add_argument("--threshold", type=int, default=10,
+                   help="maximum Hamming distance between the 64-bit pHashes of a pair (default: 10)")
+    p.set_defaults(func=cmd_duplicates)
+
+    p = subparsers.add_parser("thumbnails", help="write small JPEG thumbnails of the downloaded images to "
+                                                 "docs/thumbnails; the manifests command then uses them")
+    add_source(p)
+    p.add_argument("--workers", type=int, default=None,
+                   help="number of processes resizing images (default: number of CPUs)")
+    p.add_argument("--size", type=int, default=300,
+                   help="maximum width and height of a thumbnail in pixels (default: 300)")
+    p.set_defaults(func=cmd_thumbnails)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+
+    if args.docs:
+        from . import pipeline
+        pipeline.static_dir = os.path.abspath(args.docs)
+
+    if args.profile != "pretty" or args.compress:
+        from . import output
+        output.profile = args.profile
+        output.compress = tuple(args.compress)
+
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Columnar export of the catalog metadata
+Writes every manifest listed in docs/iiif/collection/*.json to one table,
+docs/iiif/metadata/items.parquet (or .feather, Arrow IPC): one row per
+manifest and one column per metadata label, walking the same collections
+as the XLSX export.
+
+String columns are dictionary-encoded: most fields (collection, 画工名,
+版元 ...) repeat a few hundred distinct values over thousands of rows.
+Needs pyarrow
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from .xlsx import iter_manifests
+
+FORMATS = {"parquet": ".parquet", "feather": ".feather"}
+
+FIELDS = ["collection", "manifest", "label"]
+
+
+def read_rows(static_dir: str) -> List[Dict[str, str]]:
+    """One row per manifest, multiple values of a label joined with |"""
+    rows = []
+    for name, entry in iter_manifests(static_dir):
+        values = {
+            FIELDS[0]: [name],
+            FIELDS[1]: [entry["@id"]],
+            FIELDS[2]: [entry["label"]]
+        }
+        for m in entry.get("metadata", []):
+            values.setdefault(m["label"], []).append(m["value"])
+        rows.append({field: "|".join(value) for field, value in values.items()})
+    return rows
+
+
+def build_table(rows: List[Dict[str, str]]):
+    """pyarrow Table of rows; columns in order of first appearance, null where a row has no value"""
+    import pyarrow as pa
+
+    fields = dict.fromkeys(FIELDS)
+    for row in rows:
+        for field in row:
+            fields.setdefault(field)
+
+    return pa.table({field: pa.array([row.get(field) for row in rows], pa.string()).dictionary_encode()
+                     for field in fields})
+
+
+def write_table(table, path: str, format: str = "parquet"):
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        write = pq.write_table
+    elif format == "feather":
+        import pyarrow.feather as feather
+        write = feather.write_feather
+    else:
+        raise ValueError("unknown format: {}".format(format))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    write(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def export(static_dir: str, format: str = "parquet", path: Optional[str] = None) -> str:
+    """Write the table of every manifest; return its path"""
+    if path is None:
+        path = os.path.join(static_dir, "iiif", "metadata", "items" + FORMATS[format])
+
+    table = build_table(read_rows(static_dir))
+    write_table(table, path, format)
+    print("{}: {} rows, {} columns".format(os.path.relpath(path), table.num_rows, table.num_columns))
+    return path
@@ -0,0 +1,194 @@
+"""
+Concurrent image downloader
+Fetches image URLs over a bounded pool of keep-alive connections, retrying
+with backoff and writing through a temp file so a failed transfer never
+leaves a truncated image behind. Can also probe only the JPEG header of an
+image with HTTP range requests to learn its dimensions
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .jpeg import jpeg_size
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# bytes requested per header probe; None means the whole file
+PROBE_RANGES = (4096, 65536, None)
+
+
+class Downloader:
+    """Thread pool downloader sharing one connection per worker"""
+
+    def __init__(self, workers: int = 8, retries: int = 3, backoff: float = 1.0,
+                 timeout: float = 30.0, chunk_size: int = 64 * 1024):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.downloaded = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def session(self):
+        """Return this thread's keep-alive session"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._local.session = session
+        return session
+
+    def retry(self, func: Callable):
+        """Call func, retrying connection errors and 429/5xx responses"""
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                return func()
+            except Exception as e:
+                last_error = e
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status is not None and status not in RETRY_STATUS:
+                    break
+
+        raise last_error
+
+    def fetch(self, url: str, path: str) -> int:
+        """Download url to path, returning the number of bytes written"""
+        tmp_path = "{}.{}.part".format(path, threading.get_ident())
+
+        def get():
+            try:
+                with self.session().get(url, stream=True, timeout=self.timeout) as r:
+                    r.raise_for_status()
+
+                    size = 0
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in r.iter_content(self.chunk_size):
+                            f.write(chunk)
+                            size += len(chunk)
+
+                expected = r.headers.get("Content-Length")
+                if expected is not None and "Content-Encoding" not in r.headers \
+                        and int(expected) != size:
+                    raise IOError("short read for {}: {} of {} bytes".format(url, size, expected))
+
+                os.replace(tmp_path, path)
+                return size
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        return self.retry(get)
+
+    def head_bytes(self, url: str, limit: Optional[int]) -> Tuple[bytes, Optional[int]]:
+        """Fetch the first limit bytes of url (all of it if limit is None).
+        Returns the data and the full file size when the server reports it"""
+
+        def get():
+            headers = {"Range": "bytes=0-{}".format(limit - 1)} if limit else {}
+            with self.session().get(url, headers=headers, stream=True, timeout=self.timeout) as r:
+                r.raise_for_status()
+
+                data = b""
+                for chunk in r.iter_content(min(self.chunk_size, limit or self.chunk_size)):
+                    data += chunk
+                    # the server may ignore Range and send the whole file
+                    if limit and len(data) >= limit:
+                        break
+
+                total = None
+                if r.status_code == 206:
+                    content_range = r.headers.get("Content-Range", "")
+                    if "/" in content_range and not content_range.endswith("*"):
+                        total = int(content_range.rsplit("/", 1)[1])
+                elif "Content-Length" in r.headers and "Content-Encoding" not in r.headers:
+                    total = int(r.headers["Content-Length"])
+
+                return data, total
+
+        return self.retry(get)
+
+    def probe(self, url: str) -> Dict:
+        """Read an image's dimensions from its JPEG header over range requests,
+        widening the range (and finally fetching the whole file) as needed"""
+        for limit in PROBE_RANGES:
+            data, total = self.head_bytes(url, limit)
+            with self._lock:
+                self.bytes += len(data)
+
+            size = jpeg_size(data)
+            if size is None and (limit is None or len(data) < limit):
+                raise ValueError("truncated JPEG header: {}".format(url))
+            if size is not None:
+                w, h = size
+                entry = {"width": w, "height": h}
+                if total is not None:
+                    entry["size"] = total
+                return entry
+
+    def _map(self, func: Callable, jobs: List, stage: str) -> Tuple[Dict, Dict]:
+        results: Dict = {}
+        errors: Dict[str, Exception] = {}
+        if not jobs:
+            return results, errors
+
+        start = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(func, *job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as e:
+                    errors[url] = e
+                    with self._lock:
+                        self.failed += 1
+                    print("{} failed: {} ({})".format(stage, url, e))
+                    continue
+                with self._lock:
+                    self.downloaded += 1
+                    done = self.downloaded + self.failed
+                if done % 100 == 0:
+                    print(done, len(jobs), url)
+
+        elapsed = time.time() - start
+        print("{}: {} files ({} failed), {:.1f} MB in {:.1f}s, {:.2f} MB/s".format(
+            stage, self.downloaded, self.failed, self.bytes / 1e6, elapsed,
+            self.bytes / 1e6 / elapsed if elapsed else 0.0))
+
+        return results, errors
+
+    def run(self, jobs: List[Tuple[str, str]]) -> Dict[str, Exception]:
+        """Download (url, path) pairs concurrently; return errors by url"""
+        for dirname in {os.path.dirname(path) for _, path in jobs}:
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+
+        def fetch(url, path):
+            size = self.fetch(url, path)
+            with self._lock:
+                self.bytes += size
+
+        _, errors = self._map(fetch, jobs, "download")
+        return errors
+
+    def probe_all(self, urls: List[str]) -> Dict[str, Dict]:
+        """Probe the dimensions of urls concurrently; return entries by url"""
+        results, _ = self._map(self.probe, [(url,) for url in urls], "probe")
+        return results
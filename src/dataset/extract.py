@@ -0,0 +1,170 @@
+"""
+Record extraction from harvested SHIPS detail pages
+Pulls the dcon_tbl0 metadata rows and the clioimg image links out of each
+data/*.html file (or page archive record), optionally across a process pool.
+
+Two engines produce the same records: "lxml" walks the libxml2 tree with
+XPath and only touches the metadata table and the anchors, "bs4" builds a
+full BeautifulSoup tree as the original scripts did
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .archive import Span, read_span
+
+ENGINES = ("lxml", "bs4")
+
+DCON_TBL0_XPATH = "//*[contains(concat(' ', normalize-space(@class), ' '), ' dcon_tbl0 ')][1]"
+
+# 元データの誤ったURLの修正
+URL_FIXES = {
+    "http://clioimg.hi.u-tokyo.ac.jp/EXT/nishikie/12000005/000000018.jpg":
+        "http://clioimg.hi.u-tokyo.ac.jp/EXT/nishikie/12000005/00000018.jpg",
+}
+
+
+def _rows_bs4(html: str) -> Tuple[List[Tuple[str, str]], List[Optional[str]]]:
+    import bs4
+
+    soup = bs4.BeautifulSoup(html, 'lxml')
+
+    hrefs = [a.get("href") for a in soup.find_all("a")]
+
+    rows = []
+    for tr in soup.find(class_="dcon_tbl0").find_all("tr"):
+        tds = tr.find_all("td")
+        if len(tds) == 2:
+            rows.append((tds[0].text, tds[1].text))
+
+    return rows, hrefs
+
+
+def _rows_lxml(html: str) -> Tuple[List[Tuple[str, str]], List[Optional[str]]]:
+    import lxml.html
+
+    root = lxml.html.document_fromstring(html)
+
+    hrefs = [a.get("href") for a in root.iter("a")]
+
+    rows = []
+    for tr in root.xpath(DCON_TBL0_XPATH)[0].iter("tr"):
+        tds = list(tr.iter("td"))
+        if len(tds) == 2:
+            rows.append((tds[0].text_content(), tds[1].text_content()))
+
+    return rows, hrefs
+
+
+def parse_html(html: str, engine: str = "lxml") -> Dict:
+    """Extract metadata, call number, title and image URLs from one page"""
+    if engine == "lxml":
+        rows, hrefs = _rows_lxml(html)
+    elif engine == "bs4":
+        rows, hrefs = _rows_bs4(html)
+    else:
+        raise ValueError("unknown engine: {}".format(engine))
+
+    metadata = []
+
+    cn = "-1"
+    label = ""
+
+    for field, value in rows:
+        field = field.replace("【", "").replace("】", "").strip()
+
+        if field == "":
+            continue
+
+        value = value.strip()
+
+        if value == "":
+            continue
+
+        metadata.append({
+            "label" : field,
+            "value" : value
+        })
+
+        if field == "請求記号":
+            cn = value
+
+        if field == "題名":
+            label = value
+
+    images = []
+
+    # ページ上では逆順に並んでいる
+    for href in reversed(hrefs):
+        if href and "clioimg" in href:
+            for old, new in URL_FIXES.items():
+                href = href.replace(old, new)
+            images.append(href)
+
+    return {
+        "metadata": metadata,
+        "cn": cn,
+        "label": label,
+        "images": images
+    }
+
+
+def parse_page(file: str, engine: str = "lxml") -> Dict:
+    """parse_html on the contents of a data/*.html file"""
+    with open(file) as f:
+        return parse_html(f.read(), engine)
+
+
+def _identity(page: Dict) -> Dict:
+    return page
+
+
+def _map(func, items: List, labels: List[str], workers: Optional[int],
+         convert: Optional[Callable] = None) -> List:
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # convert は結果が届くたびに親プロセスで適用する（全件の dict を同時に持たない）
+    if convert is None:
+        convert = _identity
+
+    if workers <= 1 or len(items) < 2:
+        pages = []
+        for i in range(len(items)):
+            if i % 100 == 0:
+                print(i+1, len(items), labels[i])
+            pages.append(convert(func(items[i])))
+        return pages
+
+    chunksize = max(1, len(items) // (workers * 4))
+
+    pages = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() yields results in input order, so numbering is stable
+        for i, page in enumerate(executor.map(func, items, chunksize=chunksize)):
+            if i % 100 == 0:
+                print(i+1, len(items), labels[i])
+            pages.append(convert(page))
+    return pages
+
+
+def parse_pages(files: List[str], workers: Optional[int] = None,
+                engine: str = "lxml", convert: Optional[Callable] = None) -> List:
+    """Parse files in order, using a process pool when workers > 1.
+    convert, if given, is applied to each record as it arrives"""
+    return _map(partial(parse_page, engine=engine), files, files, workers, convert)
+
+
+def parse_span(span: Span, engine: str = "lxml") -> Dict:
+    """parse_html on one page of a page archive"""
+    return parse_html(read_span(span), engine)
+
+
+def parse_spans(spans: List[Span], labels: List[str], workers: Optional[int] = None,
+                engine: str = "lxml", convert: Optional[Callable] = None) -> List:
+    """Parse page archive records (PageArchive.spans) in order. Each worker
+    reads and decompresses its own pages, so the page texts are never all
+    in memory or sent between processes"""
+    return _map(partial(parse_span, engine=engine), spans, labels, workers, convert)
@@ -0,0 +1,260 @@
+"""
+Direct HTTP harvester for the SHIPS nishikie database
+Replays the shipscontroller search and detail form posts that the Selenium
+scripts (hi_01.py ...) trigger through the browser, fetching detail records
+concurrently under a shared rate limit and writing data/NNNN.html.
+Progress is kept in data/checkpoint.json so an interrupted crawl resumes
+where it stopped instead of starting over
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from .download import Downloader
+
+BASE_URL = "https://wwwap.hi.u-tokyo.ac.jp/ships/shipscontroller"
+
+# 錦絵データベース（W18）の検索と詳細表示で送信されるフォーム項目
+# 詳細画面は form01 の hidden 項目に nowrec（レコード番号）を指定して取得する
+# （ships.js の jsRecMove が行う送信に相当）
+SEARCH_PARAMS = {
+    "screen": "list",
+    "cfname": "W18/18.ctl",
+    "pfid": "list01",
+    "nitem01": "item06",
+}
+QUERY_FIELD = "nterm01_1"
+
+CHECKPOINT_NAME = "checkpoint.json"
+DETAIL_PARAMS = {
+    "screen": "disp",
+    "cfname": "W18/18.ctl",
+    "pfid": "disp01",
+}
+
+
+class RateLimiter:
+    """Spaces request starts at least 1/rate seconds apart across threads"""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next)
+            self.next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def form_fields(html: str, name: str = "form01") -> Dict[str, str]:
+    """Return the input values of the named form"""
+    import lxml.html
+
+    root = lxml.html.document_fromstring(html)
+    forms = root.xpath("//form[@name=$name]", name=name)
+    if not forms:
+        raise ValueError("form {} not found".format(name))
+
+    fields = {}
+    for el in forms[0].iter("input"):
+        if el.get("name") and el.get("type", "text") in ("hidden", "text"):
+            fields[el.get("name")] = el.get("value", "")
+    return fields
+
+
+def record_position(html: str) -> Tuple[int, int]:
+    """Return (index, total) from the res_tbl cell, e.g. 5/2918件"""
+    import lxml.html
+
+    root = lxml.html.document_fromstring(html)
+    cell = root.xpath("//*[contains(concat(' ', normalize-space(@class), ' '), ' res_tbl ')]//td")[0]
+    index, total = cell.text_content().strip().rstrip("件").split("/")
+    return int(index), int(total)
+
+
+def normalize(html: str) -> str:
+    """Serialize a page the way the Selenium scripts saved it"""
+    from bs4 import BeautifulSoup
+
+    return str(BeautifulSoup(html, "lxml"))
+
+
+class Checkpoint:
+    """JSON record of the pages saved so far, with their content hashes"""
+
+    def __init__(self, path: str, query: str):
+        self.path = path
+        self.query = query
+        self.total: Optional[int] = None
+        self.last = 0
+        self.saved: Dict[str, str] = {}
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 検索語が異なる場合は別のクロールとして扱う
+            if data.get("query") == query:
+                self.total = data.get("total")
+                self.last = data.get("last", 0)
+                self.saved = data.get("saved", {})
+
+    def is_saved(self, index: int, path: str) -> bool:
+        """True if index was saved and the file on disk is unchanged since"""
+        digest = self.saved.get(str(index))
+        if digest is None or not os.path.exists(path):
+            return False
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest() == digest
+
+    def mark(self, index: int, digest: str):
+        self.saved[str(index)] = digest
+        # 先頭から連続して取得済みの最後のレコード番号
+        while str(self.last + 1) in self.saved:
+            self.last += 1
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as outfile:
+            json.dump({
+                "query": self.query,
+                "total": self.total,
+                "last": self.last,
+                "saved": self.saved
+            }, outfile, ensure_ascii=False, indent=4, sort_keys=True, separators=(',', ': '))
+        os.replace(tmp_path, self.path)
+
+
+class Harvester:
+    """Fetches the detail records of one SHIPS search"""
+
+    def __init__(self, query: str, data_dir: str, base_url: str = BASE_URL,
+                 workers: int = 4, rate: Optional[float] = 2.0,
+                 retries: int = 3, backoff: float = 1.0, timeout: float = 30.0):
+        self.query = query
+        self.data_dir = data_dir
+        self.base_url = base_url
+        self.workers = workers
+        self.limiter = RateLimiter(rate)
+        self.http = Downloader(workers=workers, retries=retries, backoff=backoff, timeout=timeout)
+        self._local = threading.local()
+        self.saved = 0
+        self.failed = 0
+
+    def post(self, params: Dict[str, str]) -> str:
+        def request():
+            self.limiter.wait()
+            r = self.http.session().post(self.base_url, data=params, timeout=self.http.timeout)
+            r.raise_for_status()
+            # ページは meta で utf-8 を宣言しているが、ヘッダに charset がない
+            if "charset" not in r.headers.get("Content-Type", ""):
+                r.encoding = "utf-8"
+            return r.text
+
+        return self.http.retry(request)
+
+    def search(self) -> Dict[str, str]:
+        """Run the search on this thread's session and return its form01 fields"""
+        fields = getattr(self._local, "fields", None)
+        if fields is None:
+            params = dict(SEARCH_PARAMS)
+            params[QUERY_FIELD] = self.query
+            fields = form_fields(self.post(params))
+            self._local.fields = fields
+        return fields
+
+    def fetch(self, index: int) -> str:
+        """Fetch detail record index (1-based) and return its HTML"""
+        params = dict(self.search())
+        params.update(DETAIL_PARAMS)
+        params["nowrec"] = str(index)
+        html = self.post(params)
+
+        position, _ = record_position(html)
+        if position != index:
+            raise ValueError("asked for record {}, got {}".format(index, position))
+        return html
+
+    def path(self, index: int) -> str:
+        return os.path.join(self.data_dir, str(index).zfill(4) + ".html")
+
+    def save(self, index: int, html: str) -> str:
+        """Write record index and return the sha256 of the written file"""
+        data = normalize(html).encode("utf-8")
+        path = self.path(index)
+        tmp_path = path + ".part"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return hashlib.sha256(data).hexdigest()
+
+    def fetch_and_save(self, index: int) -> str:
+        return self.save(index, self.fetch(index))
+
+    def run(self, indices: Optional[List[int]] = None, restart: bool = False) -> Dict[int, Exception]:
+        """Harvest the given records (default: all); return errors by index.
+        Records saved by an earlier run and unchanged on disk are skipped
+        unless restart is set"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        start = time.time()
+
+        checkpoint = Checkpoint(os.path.join(self.data_dir, CHECKPOINT_NAME), self.query)
+        if restart:
+            checkpoint.saved = {}
+            checkpoint.last = 0
+
+        # 1件目で総件数を確認する（再開時はチェックポイントの件数を使う）
+        done = set()
+        if checkpoint.total is None or not checkpoint.is_saved(1, self.path(1)):
+            first = self.fetch(1)
+            _, checkpoint.total = record_position(first)
+            if indices is None or 1 in indices:
+                checkpoint.mark(1, self.save(1, first))
+                done.add(1)
+                self.saved += 1
+        total = checkpoint.total
+
+        if indices is None:
+            indices = list(range(1, total + 1))
+        pending = [i for i in indices if i not in done and not checkpoint.is_saved(i, self.path(i))]
+        skipped = len(indices) - len(pending) - len(done)
+        if skipped:
+            print("resuming after record {}: {} records already saved".format(checkpoint.last, skipped))
+
+        errors: Dict[int, Exception] = {}
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = {executor.submit(self.fetch_and_save, i): i for i in pending}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    digest = future.result()
+                except Exception as e:
+                    errors[index] = e
+                    self.failed += 1
+                    print("record {} failed: {}".format(index, e))
+                    continue
+                checkpoint.mark(index, digest)
+                self.saved += 1
+                if self.saved % 100 == 0:
+                    checkpoint.save()
+                    print(self.saved, len(pending), self.path(index))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            checkpoint.save()
+
+        elapsed = time.time() - start
+        print("harvested {} of {} records ({} skipped, {} failed) in {:.1f}s, {:.2f} records/s".format(
+            self.saved, total, skipped, self.failed, elapsed, self.saved / elapsed if elapsed else 0.0))
+
+        return errors
@@ -0,0 +1,87 @@
+"""
+Persistent image-dimension index
+Stores width, height, byte size and content hash for each image URL so the
+manifest builders do not have to open the image files on every run
+"""
+
+import hashlib
+import io
+import json
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+
+def url_key(url: str) -> str:
+    """Return the md5 key used for image file names and index entries"""
+    return hashlib.md5(url.encode('utf-8')).hexdigest()
+
+
+def probe_file(path: str) -> Dict:
+    """Read width, height, byte size and content hash of a local image"""
+    from PIL import Image
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    with Image.open(io.BytesIO(data)) as im:
+        w, h = im.size
+
+    return {
+        "width": w,
+        "height": h,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest()
+    }
+
+
+class ImageIndex:
+    """JSON-backed map from image URL (md5) to its dimensions"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def __contains__(self, url: str) -> bool:
+        return url_key(url) in self.entries
+
+    def get(self, url: str) -> Optional[Dict]:
+        return self.entries.get(url_key(url))
+
+    def put(self, url: str, entry: Dict):
+        entry = dict(entry)
+        entry["url"] = url
+        self.entries[url_key(url)] = entry
+        self.dirty = True
+
+    def dimensions(self, url: str, probe: Callable[[str], Dict]) -> Tuple[int, int]:
+        """Return (width, height), calling probe(url) only on a cache miss"""
+        entry = self.get(url)
+        if entry is None:
+            self.misses += 1
+            entry = probe(url)
+            self.put(url, entry)
+        else:
+            self.hits += 1
+        return entry["width"], entry["height"]
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as outfile:
+            json.dump(self.entries, outfile, ensure_ascii=False,
+                    indent=4, sort_keys=True, separators=(',', ': '))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
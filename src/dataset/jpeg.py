@@ -0,0 +1,56 @@
+"""
+JPEG header parsing
+Reads the frame size from the SOF marker so image dimensions can be taken
+from the first few KB of a file instead of decoding the whole image
+"""
+
+import struct
+from typing import Optional, Tuple
+
+# SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+               0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# markers without a length field
+STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+
+
+def jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Return (width, height) from a JPEG prefix, or None if the SOF marker
+    lies beyond the end of data. Raises ValueError for non-JPEG input"""
+    if len(data) < 2:
+        return None
+    if data[0:2] != b"\xff\xd8":
+        raise ValueError("not a JPEG file")
+
+    pos = 2
+    n = len(data)
+
+    while True:
+        # skip fill bytes up to the next marker
+        while pos < n and data[pos] != 0xFF:
+            pos += 1
+        while pos < n and data[pos] == 0xFF:
+            pos += 1
+        if pos >= n:
+            return None
+
+        marker = data[pos]
+        pos += 1
+
+        if marker in STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ValueError("no SOF marker before image data")
+
+        if pos + 2 > n:
+            return None
+        length = struct.unpack(">H", data[pos:pos + 2])[0]
+
+        if marker in SOF_MARKERS:
+            if pos + 7 > n:
+                return None
+            h, w = struct.unpack(">HH", data[pos + 3:pos + 7])
+            return w, h
+
+        pos += length
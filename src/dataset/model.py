@@ -0,0 +1,399 @@
+"""
+Version-neutral manifest model
+Compact records for what the IIIF Presentation 2 and 3 documents of a
+record share: the builder writes both versions from the same Item, and the
+v3 converters read v2 JSON into the same classes before writing v3.
+
+The classes use __slots__ instead of per-instance dicts, metadata rows are
+(label, value) tuples and field labels are interned, so the few dozen
+distinct labels (請求記号, 題名, 画工名 ...) are stored once for the whole
+corpus rather than once per record
+"""
+
+import sys
+from typing import Dict, List, Optional, Tuple
+
+ATTRIBUTION = "東京大学史料編纂所"
+LICENSE = "https://www.hi.u-tokyo.ac.jp/tosho/shiryoriyo.html"
+LOGO = "https://www.hi.u-tokyo.ac.jp/favicon.ico"
+PROVIDER = "https://www.hi.u-tokyo.ac.jp/"
+JPEG = "image/jpeg"
+
+Metadata = Tuple[Tuple[str, str], ...]
+
+
+def metadata_rows(metadata: List[Dict]) -> Metadata:
+    """[{"label", "value"}, ...] as (label, value) tuples with interned labels.
+    v2 also allows language maps and lists as labels; those are kept as they are"""
+    return tuple((sys.intern(m["label"]) if isinstance(m["label"], str) else m["label"], m["value"])
+                 for m in metadata)
+
+
+class Image:
+    __slots__ = ("url", "width", "height", "format")
+
+    def __init__(self, url: str, width: Optional[int], height: Optional[int], format: str = JPEG):
+        self.url = url
+        self.width = width
+        self.height = height
+        self.format = format
+
+    @classmethod
+    def from_v2(cls, resource: Dict) -> "Image":
+        return cls(resource["@id"], resource.get("width"), resource.get("height"),
+                   resource.get("format", JPEG))
+
+
+# v2 で thumbnail が空（{} など）で与えられていたこと。v2 では {}、v3 では [] として書く
+EMPTY = Image("", None, None)
+
+
+def thumbnail_from_v2(v2_resource: Dict) -> Optional[Image]:
+    """The thumbnail of a v2 manifest, canvas or collection entry: None when it
+    has none, EMPTY when it is given but empty"""
+    if "thumbnail" not in v2_resource:
+        return None
+    thumbnail = v2_resource["thumbnail"]
+    return Image.from_v2(thumbnail) if thumbnail else EMPTY
+
+
+# (annotation ID, image) of one painting of a canvas
+Painting = Tuple[str, Image]
+
+
+class Canvas:
+    """A canvas painted by its images (the builder writes one per canvas)"""
+    __slots__ = ("id", "label", "width", "height", "paintings", "thumbnail")
+
+    def __init__(self, id: str, label: str, width: int, height: int,
+                 paintings: Tuple[Painting, ...], thumbnail: Optional[Image]):
+        self.id = id
+        self.label = label
+        self.width = width
+        self.height = height
+        self.paintings = paintings
+        self.thumbnail = thumbnail
+
+    @property
+    def image(self) -> Optional[Image]:
+        """The first image"""
+        return self.paintings[0][1] if self.paintings else None
+
+
+class Record:
+    """One parsed data/*.html page: call number, title, metadata and image URLs"""
+    __slots__ = ("cn", "label", "metadata", "images")
+
+    def __init__(self, cn: str, label: str, metadata: Metadata, images: Tuple[str, ...]):
+        self.cn = cn
+        self.label = label
+        self.metadata = metadata
+        self.images = images
+
+    @classmethod
+    def from_page(cls, page: Dict) -> "Record":
+        return cls(page["cn"], page["label"], metadata_rows(page["metadata"]), tuple(page["images"]))
+
+
+class Item:
+    """One manifest. metadata and canvases are None when a v2 manifest has
+    no metadata or no sequence"""
+    __slots__ = ("id", "label", "metadata", "canvases", "thumbnail", "attribution",
+                 "license", "logo", "description", "viewing_direction")
+
+    def __init__(self, id: str, label: str, metadata: Optional[Metadata],
+                 canvases: Optional[List[Canvas]] = None, thumbnail: Optional[Image] = None,
+                 attribution: Optional[str] = ATTRIBUTION, license: Optional[str] = LICENSE,
+                 logo: Optional[str] = LOGO, description: Optional[str] = None,
+                 viewing_direction: Optional[str] = "right-to-left"):
+        self.id = id
+        self.label = label
+        self.metadata = metadata
+        self.canvases = canvases
+        self.thumbnail = thumbnail
+        self.attribution = attribution
+        self.license = license
+        self.logo = logo
+        self.description = description
+        self.viewing_direction = viewing_direction
+
+    @property
+    def prefix(self) -> str:
+        return self.id.rsplit("/", 1)[0]
+
+    def add_image(self, image: Image, thumbnail: Optional[Image] = None):
+        """Append a canvas painted by image, numbered and identified as the builder does.
+        The canvas (and, for the first, the manifest) thumbnail is the image itself
+        unless a smaller derivative is given"""
+        if self.canvases is None:
+            self.canvases = []
+        index = len(self.canvases) + 1
+        thumbnail = thumbnail or image
+        self.canvases.append(Canvas(self.prefix + "/canvas/p{}".format(index), "[{}]".format(index),
+                                    image.width, image.height,
+                                    ((self.prefix + "/p{}-image".format(index), image),), thumbnail))
+        if index == 1:
+            self.thumbnail = thumbnail
+
+    @classmethod
+    def from_v2(cls, v2_manifest: Dict) -> "Item":
+        canvases = None
+        if v2_manifest.get("sequences"):
+            sequence = v2_manifest["sequences"][0]
+            if "canvases" in sequence:
+                canvases = []
+                for v2_canvas in sequence["canvases"]:
+                    # 画像の注釈はすべて持つ
+                    paintings = tuple((annotation["@id"], Image.from_v2(annotation.get("resource", {})))
+                                      for annotation in v2_canvas.get("images") or ())
+                    canvases.append(Canvas(
+                        v2_canvas["@id"], v2_canvas.get("label", ""), v2_canvas["width"], v2_canvas["height"],
+                        paintings, thumbnail_from_v2(v2_canvas)))
+
+        metadata = v2_manifest.get("metadata")
+        return cls(v2_manifest["@id"], v2_manifest.get("label", ""),
+                   metadata_rows(metadata) if metadata is not None else None,
+                   canvases=canvases,
+                   thumbnail=thumbnail_from_v2(v2_manifest),
+                   attribution=v2_manifest.get("attribution"),
+                   license=v2_manifest.get("license"),
+                   logo=v2_manifest.get("logo"),
+                   description=v2_manifest.get("description"),
+                   viewing_direction=v2_manifest.get("viewingDirection"))
+
+
+class Reference:
+    """A manifest as listed in a collection"""
+    __slots__ = ("id", "label", "license", "metadata", "thumbnail")
+
+    def __init__(self, id: str, label: str, license: Optional[str], metadata: Optional[Metadata],
+                 thumbnail: Optional[Image]):
+        self.id = id
+        self.label = label
+        self.license = license
+        self.metadata = metadata
+        self.thumbnail = thumbnail
+
+    @classmethod
+    def from_v2(cls, v2_manifest: Dict) -> "Reference":
+        """From a v2 manifest, a v2 collection entry or a summary record"""
+        metadata = v2_manifest.get("metadata")
+        return cls(v2_manifest["@id"], v2_manifest.get("label", ""), v2_manifest.get("license"),
+                   metadata_rows(metadata) if metadata is not None else None,
+                   thumbnail_from_v2(v2_manifest))
+
+
+def image_v2(image: Image) -> Dict:
+    return {
+        "@id": image.url,
+        "@type": "dctypes:Image",
+        "format": image.format,
+        "height": image.height,
+        "width": image.width
+    }
+
+
+def thumbnail_v2(image: Image) -> Dict:
+    return {} if image is EMPTY else image_v2(image)
+
+
+def metadata_v2(metadata: Metadata) -> List[Dict]:
+    return [{"label": label, "value": value} for label, value in metadata]
+
+
+def manifest_v2(item: Item) -> Dict:
+    """IIIF Presentation 2 manifest of item"""
+    m_data = {
+        "@context": "http://iiif.io/api/presentation/2/context.json",
+        "@id": item.id,
+        "@type": "sc:Manifest",
+        "label": item.label
+    }
+
+    if item.metadata is not None:
+        m_data["metadata"] = metadata_v2(item.metadata)
+
+    if item.canvases is not None:
+        canvases = []
+        for canvas in item.canvases:
+            v2_canvas = {
+                "@id": canvas.id,
+                "@type": "sc:Canvas",
+                "height": canvas.height,
+                "images": [],
+                "label": canvas.label,
+                "width": canvas.width
+            }
+            for annotation, image in canvas.paintings:
+                v2_canvas["images"].append({
+                    "@id": annotation,
+                    "@type": "oa:Annotation",
+                    "format": image.format,
+                    "motivation": "sc:painting",
+                    "on": canvas.id,
+                    "resource": image_v2(image)
+                })
+            if canvas.thumbnail:
+                v2_canvas["thumbnail"] = thumbnail_v2(canvas.thumbnail)
+            canvases.append(v2_canvas)
+
+        m_data["sequences"] = [
+            {
+                "@id": item.prefix + "/sequence/normal",
+                "@type": "sc:Sequence",
+                "canvases": canvases
+            }
+        ]
+
+    for key, value in (("attribution", item.attribution), ("license", item.license),
+                       ("logo", item.logo), ("description", item.description),
+                       ("viewingDirection", item.viewing_direction)):
+        if value is not None:
+            m_data[key] = value
+
+    if item.thumbnail:
+        m_data["thumbnail"] = thumbnail_v2(item.thumbnail)
+
+    return m_data
+
+
+def reference_v2(reference: Reference) -> Dict:
+    """v2 collection entry of a manifest"""
+    m = {
+        "@context": "http://iiif.io/api/presentation/2/context.json",
+        "@id": reference.id,
+        "@type": "sc:Manifest",
+        "label": reference.label
+    }
+
+    if reference.license is not None:
+        m["license"] = reference.license
+    if reference.metadata is not None:
+        m["metadata"] = metadata_v2(reference.metadata)
+    if reference.thumbnail:
+        m["thumbnail"] = thumbnail_v2(reference.thumbnail)
+
+    return m
+
+
+# v3 files are written unsorted: the key order below is the one
+# scripts/convert_to_v3.py and convert_collection_to_v3.py have always used
+
+def thumbnail_v3(image: Image) -> List[Dict]:
+    if image is EMPTY:
+        return []
+    return [{
+        "id": image.url,
+        "type": "Image",
+        "format": image.format,
+        "width": image.width,
+        "height": image.height
+    }]
+
+
+def metadata_v3(metadata: Metadata) -> List[Dict]:
+    return [{"label": {"ja": [label]}, "value": {"ja": [value]}} for label, value in metadata]
+
+
+def canvas_v3(canvas: Canvas) -> Dict:
+    v3_canvas = {
+        "id": canvas.id,
+        "type": "Canvas",
+        "label": {"ja": [canvas.label]},
+        "height": canvas.height,
+        "width": canvas.width,
+        "items": []
+    }
+
+    if canvas.paintings:
+        v3_canvas["items"] = [{
+            "id": canvas.id + "/page",
+            "type": "AnnotationPage",
+            "items": [{
+                "id": annotation,
+                "type": "Annotation",
+                "motivation": "painting",
+                "body": {
+                    "id": image.url,
+                    "type": "Image",
+                    "format": image.format,
+                    "height": image.height,
+                    "width": image.width
+                },
+                "target": canvas.id
+            } for annotation, image in canvas.paintings]
+        }]
+
+    if canvas.thumbnail:
+        v3_canvas["thumbnail"] = thumbnail_v3(canvas.thumbnail)
+
+    return v3_canvas
+
+
+def manifest_v3(item: Item, manifest_uri: str) -> Dict:
+    """IIIF Presentation 3 manifest of item, published at manifest_uri.
+    Canvases and annotations keep their v2 IDs"""
+    v3_manifest = {
+        "@context": "http://iiif.io/api/presentation/3/context.json",
+        "id": manifest_uri,
+        "type": "Manifest",
+        "label": {"ja": [item.label]}
+    }
+
+    if item.metadata is not None:
+        v3_manifest["metadata"] = metadata_v3(item.metadata)
+
+    if item.description is not None:
+        v3_manifest["summary"] = {"ja": [item.description]}
+
+    if item.attribution is not None:
+        v3_manifest["requiredStatement"] = {
+            "label": {"ja": ["提供"]},
+            "value": {"ja": [item.attribution]}
+        }
+
+    if item.license is not None:
+        v3_manifest["rights"] = item.license
+
+    if item.logo is not None:
+        v3_manifest["provider"] = [{
+            "id": PROVIDER,
+            "type": "Agent",
+            "label": {"ja": [ATTRIBUTION]},
+            "logo": [{
+                "id": item.logo,
+                "type": "Image",
+                "format": "image/x-icon"
+            }]
+        }]
+
+    if item.thumbnail:
+        v3_manifest["thumbnail"] = thumbnail_v3(item.thumbnail)
+
+    if item.viewing_direction is not None:
+        v3_manifest["viewingDirection"] = item.viewing_direction
+
+    if item.canvases is not None:
+        v3_manifest["items"] = [canvas_v3(canvas) for canvas in item.canvases]
+
+    return v3_manifest
+
+
+def reference_v3(reference: Reference, manifest_uri: str) -> Dict:
+    """v3 collection item of a manifest published at manifest_uri"""
+    v3_manifest = {
+        "id": manifest_uri,
+        "type": "Manifest",
+        "label": {"ja": [reference.label]}
+    }
+
+    if reference.metadata is not None:
+        v3_manifest["metadata"] = metadata_v3(reference.metadata)
+
+    if reference.thumbnail:
+        v3_manifest["thumbnail"] = thumbnail_v3(reference.thumbnail)
+
+    if reference.license is not None:
+        v3_manifest["rights"] = reference.license
+
+    return v3_manifest
@@ -0,0 +1,282 @@
+"""
+JSON serialization and output profiles
+Every stage reads and writes JSON through encode() / loads(), which use
+orjson when it is installed and the stdlib json module otherwise; both
+produce the same bytes.
+
+"pretty" writes the indented, key-sorted JSON the repository has always
+published, which keeps diffs readable; "compact" writes the same data
+minified. Either profile can add precompressed .gz / .br siblings for
+static hosts that serve them
+"""
+
+import gzip
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+PROFILES = ("pretty", "compact")
+COMPRESSIONS = ("gz", "br")
+BACKENDS = ("json", "orjson")
+
+# CLI の --profile / --compress で変更する
+profile = "pretty"
+compress: Tuple[str, ...] = ()
+
+# None: orjson があれば orjson
+backend: Optional[str] = None
+
+# orjson と json で表記が異なる指数表記の数値（1e16 / 1e+16、1e-5 / 1e-05）
+_EXPONENT = re.compile(rb"[0-9][eE][-+]?[0-9]")
+
+_orjson = None
+
+
+def _get_orjson():
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    return _orjson
+
+
+def backend_name() -> str:
+    """The backend encode() and loads() use: "orjson" if selected and installed"""
+    if backend == "json" or not _get_orjson():
+        return "json"
+    return "orjson"
+
+
+def _widen_indent(encoded: bytes) -> bytes:
+    """Turn orjson's 2-space indentation into 4 spaces.
+    Strings never contain a raw newline and no value starts with a space, so
+    the spaces after each newline are all indentation. Lines are rewritten
+    deepest first through a NUL placeholder (never present in JSON output)
+    so that bytes.replace can do the work instead of a regex callback"""
+    depth = 0
+    while b"\n" + b"  " * (depth + 1) in encoded:
+        depth += 1
+
+    for k in range(depth, 0, -1):
+        encoded = encoded.replace(b"\n" + b"  " * k, b"\n" + b"\x00" * k)
+    return encoded.replace(b"\x00", b"    ")
+
+
+def _encode_json(data, profile_name: str, sort_keys: bool) -> bytes:
+    if profile_name == "compact":
+        text = json.dumps(data, ensure_ascii=False, sort_keys=sort_keys, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=4, sort_keys=sort_keys, separators=(',', ': '))
+    return text.encode("utf-8")
+
+
+def _encode_orjson(data, profile_name: str, sort_keys: bool) -> Optional[bytes]:
+    orjson = _orjson
+    option = orjson.OPT_SORT_KEYS if sort_keys else 0
+    if profile_name != "compact":
+        option |= orjson.OPT_INDENT_2
+
+    try:
+        encoded = orjson.dumps(data, option=option)
+    except (TypeError, orjson.JSONEncodeError):
+        # 64ビットを超える整数、文字列以外のキーなど
+        return None
+
+    if _EXPONENT.search(encoded):
+        return None
+
+    if profile_name != "compact":
+        encoded = _widen_indent(encoded)
+    return encoded
+
+
+def encode(data, profile_name: Optional[str] = None, sort_keys: bool = True) -> bytes:
+    """Serialize data in a profile (default: the current one) as UTF-8 bytes.
+    The output is always that of json.dumps(ensure_ascii=False, indent=4
+    or minified); orjson falls back to json for values it would format
+    differently (NaN and Infinity are not JSON and are not written here)"""
+    profile_name = profile_name or profile
+
+    if backend_name() == "orjson":
+        encoded = _encode_orjson(data, profile_name, sort_keys)
+        if encoded is not None:
+            return encoded
+
+    return _encode_json(data, profile_name, sort_keys)
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if backend_name() == "orjson":
+        try:
+            return _orjson.loads(data)
+        except _orjson.JSONDecodeError:
+            # 64ビットを超える整数など。不正な JSON なら json が例外を出す
+            pass
+    return json.loads(data)
+
+
+def load(path: str):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def iter_array(path: str, keys: Union[str, Tuple[str, ...]], chunk_size: int = 1 << 16) -> Iterator:
+    """Stream the elements of the array under a top-level key of a JSON
+    object file, holding one element at a time rather than the whole
+    document. With several keys, the first of them found in the file is
+    streamed. Yields nothing if none is present"""
+    if isinstance(keys, str):
+        keys = (keys,)
+    decoder = json.JSONDecoder()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            # 読み終えた部分を捨ててから次のチャンクを足す
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip(chars: str) -> str:
+            """Skip whitespace and the given separators; return the next character"""
+            nonlocal pos
+            while True:
+                while pos < len(buf) and (buf[pos].isspace() or buf[pos] in chars):
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if eof:
+                    raise ValueError("unexpected end of {}".format(path))
+                fill()
+
+        def value():
+            nonlocal pos
+            skip("")
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # 要素がバッファの途中で切れている
+                    if eof:
+                        raise
+                    fill()
+                    continue
+                # 数値はチャンクの境目で切れても（1e5 が 1 と）読めてしまうので、
+                # 値の後に区切りが見えるまで読み足す
+                if not eof and (end == len(buf) or buf[end] not in ",:]} \t\r\n"):
+                    fill()
+                    continue
+                pos = end
+                return obj
+
+        fill()
+        if skip("") != "{":
+            raise ValueError("{} is not a JSON object".format(path))
+        pos += 1
+
+        while skip(",") != "}":
+            name = value()
+            if skip("") != ":":
+                raise ValueError("expected ':' in {}".format(path))
+            pos += 1
+
+            if name not in keys:
+                value()
+                continue
+
+            if skip("") != "[":
+                raise ValueError("{} in {} is not an array".format(name, path))
+            pos += 1
+            while skip(",") != "]":
+                yield value()
+            return
+
+
+def compress_bytes(data: bytes, ext: str) -> bytes:
+    if ext == "gz":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if ext == "br":
+        import brotli
+        return brotli.compress(data, quality=11)
+    raise ValueError("unknown compression: {}".format(ext))
+
+
+def _write(path: str, data: bytes):
+    # 同じファイルを複数のプロセスが書いても一時ファイルは別にする
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_bytes(path: str, data: bytes, compressions: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Write data and its precompressed siblings; return the size of each"""
+    if compressions is None:
+        compressions = compress
+
+    _write(path, data)
+    sizes = {"json": len(data)}
+
+    for ext in COMPRESSIONS:
+        sibling = path + "." + ext
+        if ext in compressions:
+            packed = compress_bytes(data, ext)
+            _write(sibling, packed)
+            sizes[ext] = len(packed)
+        elif os.path.exists(sibling):
+            # 古い圧縮ファイルが残ると内容が食い違う
+            os.remove(sibling)
+
+    return sizes
+
+
+def write_json(data, path: str, sort_keys: bool = True) -> Dict[str, int]:
+    """Write data to path in the current profile"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return write_bytes(path, encode(data, sort_keys=sort_keys))
+
+
+def tree_name(root: str, path: str) -> str:
+    """Report group of a file: 2, 3, collection, or nishikie_hi for iiif/nishikie_hi-NNNN"""
+    top = os.path.relpath(path, root).split(os.sep)[0]
+    if top.endswith(".json"):
+        return "."
+    return re.sub(r"-\d+$", "", top)
+
+
+def rewrite_tree(root: str, profile_name: str, compressions: Iterable[str]) -> List[Dict]:
+    """Rewrite every *.json under root in profile_name; return before/after totals per tree"""
+    compressions = tuple(compressions)
+    totals: Dict[str, Dict] = {}
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(dirpath, filename)
+
+            with open(path, 'rb') as f:
+                before = f.read()
+            # キーの順序は元のファイルのまま（pretty に戻したときに差分が出ないように）
+            data = encode(loads(before), profile_name, sort_keys=False)
+            sizes = write_bytes(path, data, compressions)
+
+            total = totals.setdefault(tree_name(root, path), {"files": 0, "before": 0, "after": 0})
+            total["files"] += 1
+            total["before"] += len(before)
+            total["after"] += sizes["json"]
+            for ext in compressions:
+                total[ext] = total.get(ext, 0) + sizes[ext]
+
+    return [dict(tree=name, **totals[name]) for name in sorted(totals)]
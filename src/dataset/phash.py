@@ -0,0 +1,207 @@
+"""
+Perceptual hashes of the downloaded images
+64-bit dHash (sign of horizontal gradients of a 9x8 thumbnail) and pHash
+(sign of the low 8x8 DCT coefficients of a 32x32 thumbnail against their
+median) of every image, to find the same print appearing more than once.
+
+Images are decoded with Pillow's JPEG draft mode, which reduces in the DCT
+domain (1/2 to 1/8 scale) instead of decoding full size; the hashes of a
+batch are computed together with NumPy in worker processes. Near-duplicates
+are found with a BK-tree over the Hamming distance, so a lookup only visits
+the part of the tree within the threshold instead of comparing all pairs
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import output
+
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+# 1回の受け渡しで処理する画像の数
+BATCH = 32
+
+
+def decode(path: str):
+    """Grayscale 9x8 and 32x32 thumbnails of an image as float32 arrays"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(path) as im:
+        # JPEG はここで縮小デコードになる（他の形式では何もしない）
+        im.draft("L", (DCT_SIZE * 2, DCT_SIZE * 2))
+        im = im.convert("L")
+        small = im.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+        square = im.resize((DCT_SIZE, DCT_SIZE), Image.BILINEAR)
+    return np.asarray(small, dtype=np.float32), np.asarray(square, dtype=np.float32)
+
+
+def dct_matrix(n: int):
+    """Orthonormal DCT-II matrix: D @ x is the DCT of x"""
+    import numpy as np
+
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+def pack(bits) -> List[str]:
+    """(n, 64) booleans as 16-digit hex strings"""
+    import numpy as np
+
+    return [row.tobytes().hex() for row in np.packbits(bits, axis=1)]
+
+
+def hash_arrays(smalls, squares) -> Tuple[List[str], List[str]]:
+    """dHash and pHash of a batch: arrays of shape (n, 8, 9) and (n, 32, 32)"""
+    import numpy as np
+
+    n = len(smalls)
+    dhash = (smalls[:, :, 1:] > smalls[:, :, :-1]).reshape(n, -1)
+
+    d = dct_matrix(DCT_SIZE)
+    low = (d @ squares @ d.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(n, -1)
+    # 直流成分は除いて中央値を取る
+    median = np.median(low[:, 1:], axis=1)
+    phash = low > median[:, None]
+
+    return pack(dhash), pack(phash)
+
+
+def hash_files(paths: List[str]) -> List[Optional[Dict]]:
+    """Hashes of a batch of image files; None for a file that cannot be decoded"""
+    import numpy as np
+
+    decoded = []
+    for path in paths:
+        try:
+            decoded.append(decode(path))
+        except (OSError, ValueError):
+            decoded.append(None)
+
+    ok = [x for x in decoded if x is not None]
+    if not ok:
+        return [None] * len(paths)
+    dhashes, phashes = hash_arrays(np.stack([x[0] for x in ok]), np.stack([x[1] for x in ok]))
+
+    results = []
+    j = 0
+    for path, x in zip(paths, decoded):
+        if x is None:
+            results.append(None)
+            continue
+        stat = os.stat(path)
+        results.append({"dhash": dhashes[j], "phash": phashes[j], "size": stat.st_size, "mtime": stat.st_mtime_ns})
+        j += 1
+    return results
+
+
+class HashIndex:
+    """JSON-backed map from image file name (the md5 of its URL) to its hashes,
+    stored next to the image index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self.dirty = False
+
+        if os.path.exists(path):
+            self.entries = output.load(path)
+
+    def is_current(self, key: str, path: str) -> bool:
+        """True if the file is unchanged (same size and modification time) since it was hashed"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        stat = os.stat(path)
+        return entry["size"] == stat.st_size and entry.get("mtime") == stat.st_mtime_ns
+
+    def update(self, files: Dict[str, str], workers: Optional[int] = None) -> int:
+        """Hash the files ({key: path}) that are new or changed; return how many"""
+        todo = [(key, path) for key, path in sorted(files.items()) if not self.is_current(key, path)]
+        batches = [todo[i:i + BATCH] for i in range(0, len(todo), BATCH)]
+
+        paths = [[path for _, path in batch] for batch in batches]
+        if workers == 1 or len(batches) < 2:
+            self._add(batches, map(hash_files, paths))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self._add(batches, executor.map(hash_files, paths))
+        return len(todo)
+
+    def _add(self, batches, results: Iterable[List[Optional[Dict]]]):
+        for batch, hashes in zip(batches, results):
+            for (key, path), entry in zip(batch, hashes):
+                if entry is None:
+                    print("cannot decode", path)
+                    continue
+                self.entries[key] = entry
+                self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        # 画像索引と同じ整形で、圧縮ファイルは作らない
+        output.write_bytes(self.path, output.encode(self.entries, "pretty"), ())
+        self.dirty = False
+
+
+def distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree of 64-bit hashes under the Hamming distance.
+    Each node keeps the items with its hash and its children by distance;
+    by the triangle inequality a search with radius r only descends into
+    children at distance d - r .. d + r of a node at distance d"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value: int, item):
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+        node = self.root
+        while True:
+            d = distance(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            if d not in node[2]:
+                node[2][d] = (value, [item], {})
+                return
+            node = node[2][d]
+
+    def find(self, value: int, radius: int) -> List[Tuple[int, object]]:
+        """(distance, item) of every item within radius of value"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = distance(value, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            for child_d, child in node[2].items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        return found
+
+
+def near_duplicates(hashes: Dict[str, Dict], threshold: int, key: str = "phash") -> List[Tuple[int, str, str]]:
+    """(distance, a, b) for every pair of images whose hashes differ in at most threshold bits"""
+    tree = BKTree()
+    pairs = []
+    for name in sorted(hashes):
+        value = int(hashes[name][key], 16)
+        for d, other in tree.find(value, threshold):
+            pairs.append((d, other, name))
+        tree.add(value, name)
+    pairs.sort()
+    return pairs
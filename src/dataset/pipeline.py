@@ -0,0 +1,441 @@
+"""
+Shared build pipeline for the nishikie sources
+Builds the IIIF v2 and v3 manifests and the collections of every configured
+source in one run, sharing the parsing process pool, the image index and the HTTP
+connection pool between them.
+
+Run through the CLI: dataset manifests / dataset collections
+"""
+
+import glob
+import os
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from .archive import PageArchive, find_archive
+from . import output
+from .download import Downloader
+from .extract import parse_pages, parse_spans
+from .images import ImageIndex, probe_file, url_key
+from .model import Image, Item, Record, Reference, manifest_v2, manifest_v3, reference_v2
+
+# catalog, registry, phash, thumbnails は使う関数の中で読み込む（collections だけの実行を速く保つ）
+if TYPE_CHECKING:
+    from .thumbnails import Thumbnails
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+NISHIKIE_DIR = os.path.join(ROOT_DIR, "src", "nishikie")
+
+prefix0 = "https://hi-ut.github.io/dataset"
+static_dir = os.path.join(ROOT_DIR, "docs")
+
+# 新しいソースはここに追加する
+#   name: src/nishikie/<name>/data/*.html を読み、iiif/<name>-NNNN を出力する
+#   label: コレクションのラベル
+#   check_numbering: data/NNNN.html の番号が連番であることを確認する
+#   query: SHIPSの検索語（所蔵機関）
+#   scraper: SHIPSからdata/*.htmlを取得するSeleniumスクリプト
+SOURCES = [
+    {
+        "name": "nishikie_hi",
+        "label": "東京大学史料編纂所・錦絵データベース",
+        "check_numbering": False,
+        "query": "東京大学史料編纂所",
+        "scraper": "hi_01.py",
+    },
+    {
+        "name": "nishikie_shizuoka",
+        "label": "東京大学史料編纂所・錦絵データベース（静岡県立中央図書館）",
+        "check_numbering": True,
+        "query": "静岡県立中央図書館",
+        "scraper": "hi_02.py",
+    },
+    {
+        "name": "nishikie_yokohama",
+        "label": "東京大学史料編纂所・錦絵データベース（横浜開港資料館）",
+        "check_numbering": False,
+        "query": "横浜開港資料館",
+        "scraper": "hi_03.py",
+    },
+]
+
+download_workers = 8
+
+
+def get_source(name: str) -> Dict:
+    for source in SOURCES:
+        if source["name"] == name:
+            return source
+    raise KeyError("unknown source: {}".format(name))
+
+
+def source_dir(source: Dict) -> str:
+    return os.path.join(NISHIKIE_DIR, source["name"])
+
+
+def image_path(source: Dict, url: str) -> str:
+    return os.path.join(source_dir(source), "images", "{}.jpg".format(url_key(url)))
+
+
+def summary_path(source: Dict) -> str:
+    # マニフェスト作成時に書き出す、コレクション用の要約（1行1マニフェストのJSON Lines）
+    # 出力先（static_dir）ごとに iiif/summary/<name>.jsonl に置く
+    return os.path.join(static_dir, "iiif", "summary", "{}.jsonl".format(source["name"]))
+
+
+def manifest_prefix(source: Dict, i: int) -> str:
+    return prefix0 + "/iiif/{}-{}".format(source["name"], str(i+1).zfill(4))
+
+
+def manifest_v3_uri(source: Dict, i: int) -> str:
+    return prefix0 + "/iiif/3/{}-{}/manifest.json".format(source["name"], str(i+1).zfill(4))
+
+
+def copy_images(paths: Dict[str, List[str]]):
+    """Copy each image to the paths where it is missing from one where it exists"""
+    import shutil
+
+    for targets in paths.values():
+        existing = [path for path in targets if os.path.exists(path)]
+        if not existing:
+            continue
+        for path in targets:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = path + ".tmp"
+                shutil.copyfile(existing[0], tmp_path)
+                os.replace(tmp_path, path)
+
+
+def create_item(prefix: str, record: Record, image_index: ImageIndex, probe,
+                thumbnails: Optional["Thumbnails"] = None) -> Item:
+    """Build the version-neutral model of one harvested page. Canvas and
+    manifest thumbnails point at the local derivatives where they exist"""
+    item = Item(prefix + "/manifest.json", record.label, record.metadata)
+
+    for url in record.images:
+
+        try:
+            w, h = image_index.dimensions(url, probe)
+            item.add_image(Image(url, w, h), thumbnails.get(url) if thumbnails else None)
+
+        except Exception as e:
+            print(e)
+
+    # 画像がなくても空のシーケンスを出力する
+    if item.canvases is None:
+        item.canvases = []
+
+    return item
+
+
+def manifest_summary(m_data: Dict) -> Dict:
+    """The fields of a manifest that its collection entry copies"""
+    summary = {
+        "@id": m_data["@id"],
+        "license": m_data["license"],
+        "metadata": m_data["metadata"],
+        "label": m_data["label"]
+    }
+
+    if "thumbnail" in m_data:
+        summary["thumbnail"] = m_data["thumbnail"]
+
+    return summary
+
+
+def read_summary(path: str) -> Iterator[Dict]:
+    """Stream the records of a summary.jsonl"""
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield output.loads(line)
+
+
+def write_json(data: Dict, uri: str, sort_keys: bool = True):
+    # 出力形式（pretty / compact、圧縮ファイル）は dataset.output の設定に従う
+    output.write_json(data, uri.replace(prefix0, static_dir), sort_keys)
+
+
+def check_pages(source: Dict, files: List[str]):
+    # 請求記号の重複は全ソースをまとめて dataset.registry が報告する
+    if source["check_numbering"]:
+        for i in range(len(files)):
+            if str(i+1) not in files[i]:
+                print(files[i])
+
+
+def create_manifests(sources: List[Dict], workers: Optional[int] = None,
+                     engine: str = "lxml", probe: bool = False, from_archive: bool = False):
+    """Parse, fetch image sizes and write the v2 and v3 manifests of all sources.
+    With from_archive the pages are read from each source's page archive
+    (dataset archive) instead of data/*.html"""
+    from . import catalog, registry
+    from .thumbnails import Thumbnails
+
+    files = {}
+    spans = []
+    for source in sources:
+        if from_archive:
+            archive = PageArchive(find_archive(source_dir(source)))
+            # 記録名（NNNN）は data/NNNN.html のファイル名と対応する
+            files[source["name"]] = [os.path.join(source_dir(source), "data", name + ".html")
+                                     for name in archive.names()]
+            spans += archive.spans()
+        else:
+            files[source["name"]] = sorted(glob.glob(os.path.join(source_dir(source), "data", "*.html")))
+
+    # 全ソースのページを一つのプールで解析する
+    all_files = [file for source in sources for file in files[source["name"]]]
+    if from_archive:
+        all_pages = parse_spans(spans, all_files, workers, engine, Record.from_page)
+    else:
+        all_pages = parse_pages(all_files, workers, engine, Record.from_page)
+
+    pages = {}
+    start = 0
+    for source in sources:
+        n = len(files[source["name"]])
+        pages[source["name"]] = all_pages[start:start + n]
+        start += n
+        check_pages(source, files[source["name"]])
+
+    image_index = ImageIndex(os.path.join(NISHIKIE_DIR, "image_index.json"))
+
+    # 画像のダウンロード（インデックス未登録かつ未取得のもののみ）
+    # --probe の場合は画像を保存せず、JPEGヘッダのみを取得してサイズを登録する
+
+    # 同じ URL を複数のソースが参照することがあるので、URL ごとに保存先をまとめる
+    paths: Dict[str, List[str]] = {}
+    for source in sources:
+        for page in pages[source["name"]]:
+            for url in page.images:
+                if url not in image_index:
+                    path = image_path(source, url)
+                    targets = paths.setdefault(url, [])
+                    if path not in targets:
+                        targets.append(path)
+
+    downloader = Downloader(workers=download_workers)
+    if probe:
+        for url, entry in downloader.probe_all(list(paths)).items():
+            image_index.put(url, entry)
+    else:
+        # 1回だけ取得し、他のソースの images/ には複製する
+        jobs = {}
+        for url, targets in paths.items():
+            missing = [path for path in targets if not os.path.exists(path)]
+            if missing and len(missing) == len(targets):
+                jobs[url] = missing[0]
+        downloader.run(list(jobs.items()))
+        copy_images(paths)
+
+    thumbnails = Thumbnails(static_dir, prefix0)
+    conn = catalog.connect(catalog.catalog_path(static_dir))
+    callnumbers = registry.Registry(registry.registry_path(static_dir))
+
+    for source in sources:
+
+        def probe_image(url):
+            return probe_file(image_path(source, url))
+
+        source_pages = pages[source["name"]]
+        source_files = files[source["name"]]
+        entries = []
+        path = summary_path(source)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'wb') as summary:
+            for i in range(len(source_pages)):
+                # v2 と v3 を同じモデルから書き出す
+                item = create_item(manifest_prefix(source, i), source_pages[i], image_index, probe_image,
+                                   thumbnails)
+                m_data = manifest_v2(item)
+                write_json(m_data, m_data["@id"])
+                v3_data = manifest_v3(item, manifest_v3_uri(source, i))
+                write_json(v3_data, v3_data["id"], sort_keys=False)
+                summary.write(output.encode(manifest_summary(m_data), "compact") + b"\n")
+                # 公開する登録簿にはソースの data/ からの相対パス（NNNN.html）だけを残す
+                entries.append((source_pages[i].cn, m_data["@id"], os.path.basename(source_files[i])))
+        os.replace(path + ".tmp", path)
+        callnumbers.replace_source(source["name"], entries)
+
+        print("{}: {} manifests".format(source["name"], len(source_pages)))
+        update_catalog(conn, source)
+
+    conn.close()
+
+    callnumbers.save()
+    registry.write_report(callnumbers, registry.report_path(static_dir))
+
+    image_index.save()
+    print("image index: {} hits, {} misses".format(image_index.hits, image_index.misses))
+
+
+def update_catalog(conn, source: Dict):
+    """Sync the catalog rows of a source with its summary (or its manifests when there is none)"""
+    from . import catalog
+
+    if os.path.exists(summary_path(source)):
+        records = read_summary(summary_path(source))
+    else:
+        records = read_manifests(source)
+
+    counts = catalog.update(conn, source["name"], records)
+    print("{}: catalog {}".format(source["name"], ", ".join("{} {}".format(n, k) for k, n in counts.items())))
+
+
+def create_thumbnails(sources: List[Dict], workers: Optional[int] = None, size: Optional[int] = None):
+    """Write the thumbnails of the downloaded images of the sources under static_dir/thumbnails
+    (size: longest side, default thumbnails.SIZE)"""
+    from .thumbnails import SIZE, Thumbnails
+
+    thumbnails = Thumbnails(static_dir, prefix0)
+    if size is None:
+        size = SIZE
+
+    for source in sources:
+        files = {}
+        for path in glob.glob(os.path.join(source_dir(source), "images", "*.jpg")):
+            files[os.path.splitext(os.path.basename(path))[0]] = path
+
+        n = thumbnails.update(files, size, workers)
+        print("{}: {} images, {} thumbnails written".format(source["name"], len(files), n))
+
+    thumbnails.save()
+
+
+def image_owners(sources: List[Dict]) -> Dict[str, Dict]:
+    """Manifest, canvas and call number of each image file (md5 of its URL), from the written v2 manifests"""
+    owners = {}
+    for source in sources:
+        for file in sorted(glob.glob(static_dir + "/iiif/{}*/manifest.json".format(source["name"]))):
+            item = Item.from_v2(output.load(file))
+            cn = dict(item.metadata or ()).get("請求記号")
+            for canvas in item.canvases or []:
+                for _, image in canvas.paintings:
+                    owners[url_key(image.url)] = {
+                        "manifest": item.id, "canvas": canvas.id, "cn": cn, "label": item.label
+                    }
+    return owners
+
+
+def find_duplicate_images(sources: List[Dict], workers: Optional[int] = None, threshold: int = 10):
+    """Hash the downloaded images of the sources (only those not hashed yet) and
+    report the pairs whose pHashes differ in at most threshold bits"""
+    from .phash import HashIndex, distance, near_duplicates
+
+    hashes = HashIndex(os.path.join(NISHIKIE_DIR, "image_hashes.json"))
+
+    files = {}
+    for source in sources:
+        for path in glob.glob(os.path.join(source_dir(source), "images", "*.jpg")):
+            files[os.path.splitext(os.path.basename(path))[0]] = path
+
+    n = hashes.update(files, workers)
+    hashes.save()
+    print("image hashes: {} images, {} new".format(len(files), n))
+
+    owners = image_owners(sources)
+    pairs = []
+    for d, a, b in near_duplicates({key: hashes.entries[key] for key in files if key in hashes.entries},
+                                   threshold):
+        images = [dict(owners.get(key, {}), file=os.path.relpath(files[key], ROOT_DIR)) for key in (a, b)]
+        pairs.append({
+            "phash": d,
+            "dhash": distance(int(hashes.entries[a]["dhash"], 16), int(hashes.entries[b]["dhash"], 16)),
+            # 同じ記録の別画像か、別の記録（請求記号）か
+            "same_manifest": images[0].get("manifest") == images[1].get("manifest"),
+            "images": images
+        })
+
+    path = os.path.join(static_dir, "iiif", "summary", "images-report.json")
+    output.write_json({"images": len(files), "threshold": threshold, "pairs": pairs}, path)
+    print("near-duplicate images: {} pairs ({})".format(len(pairs), os.path.relpath(path)))
+
+
+def read_manifests(source: Dict) -> Iterator[Dict]:
+    """Summaries of every manifest written for a source, in file order"""
+    files = glob.glob(static_dir+"/iiif/{}*/manifest.json".format(source["name"]))
+
+    for file in sorted(files):
+        yield manifest_summary(output.load(file))
+
+
+def collection_uri(source: Dict, page: Optional[int] = None) -> str:
+    if page is None:
+        return prefix0 + "/iiif/collection/{}.json".format(source["name"])
+    return prefix0 + "/iiif/collection/{}/{}.json".format(source["name"], page)
+
+
+def remove_pages(source: Dict, keep: int):
+    """Delete page files (and their siblings) numbered above keep"""
+    pages_dir = os.path.join(static_dir, "iiif", "collection", source["name"])
+    for file in glob.glob(pages_dir + "/*.json*"):
+        number = os.path.basename(file).split(".")[0]
+        if number.isdigit() and int(number) > keep:
+            os.remove(file)
+
+
+def create_collection(source: Dict, page_size: Optional[int] = None):
+    """Write the collection listing every manifest of one source.
+    Reads the summary written by the last manifests run, or every manifest
+    when there is none. With page_size, the collection only links to the
+    first and last of a chain of pages holding page_size manifests each"""
+    if os.path.exists(summary_path(source)):
+        records = read_summary(summary_path(source))
+    else:
+        records = read_manifests(source)
+
+    manifests = []
+
+    for record in records:
+        manifests.append(Reference.from_v2(record))
+
+    collection = {
+        "@context": "http://iiif.io/api/presentation/2/context.json",
+        "@id": collection_uri(source),
+        "@type": "sc:Collection",
+        "label": source["label"],
+        "vhint": "use-thumb",
+        "within": prefix0 + "/iiif/collection/nishikie.json"
+    }
+
+    if not page_size or len(manifests) <= page_size:
+        collection["manifests"] = [reference_v2(m) for m in manifests]
+        write_json(collection, collection["@id"])
+        remove_pages(source, 0)
+
+        print("{}: collection of {} manifests".format(source["name"], len(manifests)))
+        return
+
+    # IIIF Presentation 2.1 のページング（first / last / total、各ページに next / prev / startIndex）
+    pages = [manifests[i:i + page_size] for i in range(0, len(manifests), page_size)]
+
+    collection["total"] = len(manifests)
+    collection["first"] = collection_uri(source, 1)
+    collection["last"] = collection_uri(source, len(pages))
+
+    for n in range(1, len(pages) + 1):
+        start = (n - 1) * page_size
+
+        page = {
+            "@context": "http://iiif.io/api/presentation/2/context.json",
+            "@id": collection_uri(source, n),
+            "@type": "sc:Collection",
+            "label": "{} {}-{}".format(source["label"], start + 1, start + len(pages[n - 1])),
+            "manifests": [reference_v2(m) for m in pages[n - 1]],
+            "startIndex": start,
+            "vhint": "use-thumb",
+            "within": collection["@id"]
+        }
+
+        if n > 1:
+            page["prev"] = collection_uri(source, n - 1)
+        if n < len(pages):
+            page["next"] = collection_uri(source, n + 1)
+
+        write_json(page, page["@id"])
+
+    remove_pages(source, len(pages))
+    write_json(collection, collection["@id"])
+
+    print("{}: collection of {} manifests in {} pages".format(source["name"], len(manifests), len(pages)))
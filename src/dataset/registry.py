@@ -0,0 +1,109 @@
+"""
+Call number registry
+Maps the call numbers (請求記号) of every source to their manifests through
+a hash index keyed by the normalized call number, persisted next to the
+summaries (iiif/summary/callnumbers.json) so that a run over one source is
+still checked against the others.
+
+Normalization is NFKC (full-width letters, digits and symbols to their
+ASCII forms), dash variants to "-" and removal of all whitespace. Entries
+sharing a key are reported as "exact" collisions when the call numbers are
+identical and as "normalized" (near) collisions when they only match after
+normalization. Building, updating and reporting are linear in the number
+of entries
+"""
+
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+
+from . import output
+
+VERSION = 2
+
+# NFKC で「-」にならない横線（ハイフン、マイナス、ダッシュ類）
+_DASHES = str.maketrans({c: "-" for c in "‐‑‒–—―−ーｰ"})
+_SPACE = re.compile(r"\s+")
+
+# (call number, source, manifest URI, page file relative to the source's data/ directory)
+Entry = Tuple[str, str, str, str]
+
+
+def normalize(cn: str) -> str:
+    return _SPACE.sub("", unicodedata.normalize("NFKC", cn).translate(_DASHES))
+
+
+def registry_path(static_dir: str) -> str:
+    return os.path.join(static_dir, "iiif", "summary", "callnumbers.json")
+
+
+class Registry:
+    def __init__(self, path: str):
+        self.path = path
+        self.index: Dict[str, List[Entry]] = {}
+        if os.path.exists(path):
+            data = output.load(path)
+            if data.get("version") == VERSION:
+                self.index = {key: [tuple(entry) for entry in entries]
+                              for key, entries in data["index"].items()}
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.index.values())
+
+    def replace_source(self, source: str, entries: Iterable[Tuple[str, str, str]]):
+        """Replace the entries of source with (call number, manifest, page) triples"""
+        index: Dict[str, List[Entry]] = {}
+        for key, old in self.index.items():
+            kept = [entry for entry in old if entry[1] != source]
+            if kept:
+                index[key] = kept
+
+        for cn, manifest, page in entries:
+            index.setdefault(normalize(cn), []).append((cn, source, manifest, page))
+        self.index = index
+
+    def collisions(self) -> List[Dict]:
+        """Keys shared by more than one entry, in key order"""
+        report = []
+        for key in sorted(self.index):
+            entries = self.index[key]
+            if len(entries) < 2:
+                continue
+            report.append({
+                "key": key,
+                "kind": "exact" if len({entry[0] for entry in entries}) == 1 else "normalized",
+                "sources": sorted({entry[1] for entry in entries}),
+                "entries": [dict(zip(("cn", "source", "manifest", "page"), entry)) for entry in entries]
+            })
+        return report
+
+    def save(self):
+        # 他の出力と同じく現在のプロファイルで書く（dataset reformat で内容が変わらないように）
+        output.write_json({
+            "version": VERSION,
+            "index": {key: [list(entry) for entry in entries] for key, entries in self.index.items()}
+        }, self.path)
+
+
+def report_path(static_dir: str) -> str:
+    return os.path.join(static_dir, "iiif", "summary", "callnumbers-report.json")
+
+
+def write_report(registry: Registry, path: str) -> List[Dict]:
+    """Write the collision report as JSON and print one line per collision"""
+    report = registry.collisions()
+    output.write_json({
+        "entries": len(registry),
+        "keys": len(registry.index),
+        "exact": sum(1 for c in report if c["kind"] == "exact"),
+        "normalized": sum(1 for c in report if c["kind"] == "normalized"),
+        "collisions": report
+    }, path)
+
+    for collision in report:
+        print("{} {}: {}".format(collision["kind"], collision["key"], ", ".join(
+            "{} ({}/{})".format(entry["cn"], entry["source"], entry["page"]) for entry in collision["entries"])))
+    print("call numbers: {} entries, {} collisions ({})".format(
+        len(registry), len(report), os.path.relpath(path)))
+    return report
@@ -0,0 +1,196 @@
+"""
+Static full-text search index of the collection metadata
+Indexes the label and metadata values (題名, 画工名, 版元, 主題 ...) of every
+manifest in docs/iiif/collection/*.json and writes an inverted index of
+static JSON files under docs/search, so that a browser or a script can
+answer a query by fetching a few small files instead of whole collections.
+
+Text is NFKC-normalized and lowercased, then each run of word characters
+is cut into character bigrams, plus its last character alone, so that
+every character starts some token. Layout:
+
+  search/index.json       {"version", "ngram", "documents", "chunk", "shards"}
+  search/shards/<i>.json  {token: [doc id gaps]}, tokens in code point order
+  search/docs/<k>.json    [[manifest, label, collection], ...] for the
+                          doc ids k*chunk .. (k+1)*chunk-1
+
+"shards" lists the first token of each shard: the tokens are split into
+ranges of about SHARD_SIZE bytes, so a token (or every token with a given
+prefix) is in the shard whose first token is the last one <= it. Postings
+are sorted doc ids stored as gaps. A query matches the documents that
+contain all its bigrams; a one-character run matches any token starting
+with that character
+"""
+
+import bisect
+import glob
+import os
+import re
+import unicodedata
+from typing import Dict, List, Set
+
+from . import output
+from .xlsx import iter_manifests
+
+VERSION = 1
+NGRAM = 2
+
+# シャード1つのおおよその大きさ（バイト）
+SHARD_SIZE = 32 * 1024
+DOC_CHUNK = 256
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def runs(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+def tokens(text: str) -> Set[str]:
+    """Index tokens of text: the bigrams and the last character of each run"""
+    result = set()
+    for run in runs(text):
+        for i in range(len(run) - NGRAM + 1):
+            result.add(run[i:i + NGRAM])
+        result.add(run[-1])
+    return result
+
+
+def gaps(ids: List[int]) -> List[int]:
+    return [ids[0]] + [ids[i] - ids[i - 1] for i in range(1, len(ids))]
+
+
+def ungaps(values: List[int]) -> List[int]:
+    ids = []
+    total = 0
+    for value in values:
+        total += value
+        ids.append(total)
+    return ids
+
+
+def search_dir(static_dir: str) -> str:
+    return os.path.join(static_dir, "search")
+
+
+def _write(data, path: str, written: Set[str]):
+    # 機械が読むファイルなので常に compact
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    output.write_bytes(path, output.encode(data, "compact"))
+    written.add(path)
+
+
+def build_index(static_dir: str, shard_size: int = SHARD_SIZE) -> Dict:
+    """Index every manifest listed in the collections; return index.json"""
+    docs = []
+    postings: Dict[str, List[int]] = {}
+
+    for doc_id, (name, entry) in enumerate(iter_manifests(static_dir)):
+        docs.append([entry["@id"], entry["label"], name])
+
+        words = tokens(entry["label"])
+        for m in entry.get("metadata", []):
+            words |= tokens(m["value"])
+        for word in words:
+            postings.setdefault(word, []).append(doc_id)
+
+    root = search_dir(static_dir)
+    written: Set[str] = set()
+
+    for k in range(0, len(docs), DOC_CHUNK):
+        _write(docs[k:k + DOC_CHUNK], os.path.join(root, "docs", "{}.json".format(k // DOC_CHUNK)), written)
+
+    # コードポイント順に並べたトークンを、大きさがほぼ揃うように区切る
+    shards: List[str] = []
+    shard: Dict[str, List[int]] = {}
+    size = 0
+    for word in sorted(postings):
+        entry_size = len(output.encode([word, gaps(postings[word])], "compact"))
+        if shard and size + entry_size > shard_size:
+            _write(shard, os.path.join(root, "shards", "{}.json".format(len(shards) - 1)), written)
+            shard = {}
+            size = 0
+        if not shard:
+            shards.append(word)
+        shard[word] = gaps(postings[word])
+        size += entry_size
+    if shard:
+        _write(shard, os.path.join(root, "shards", "{}.json".format(len(shards) - 1)), written)
+
+    index = {
+        "version": VERSION,
+        "ngram": NGRAM,
+        "documents": len(docs),
+        "chunk": DOC_CHUNK,
+        "shards": shards
+    }
+    _write(index, os.path.join(root, "index.json"), written)
+
+    # 前回の方が多かったシャード・文書ファイルを消す
+    for path in glob.glob(os.path.join(root, "*", "*.json*")):
+        if path.split(".json")[0] + ".json" not in written:
+            os.remove(path)
+
+    print("{}: {} documents, {} tokens, {} shards".format(
+        os.path.relpath(root), len(docs), len(postings), len(shards)))
+    return index
+
+
+class Index:
+    """Reads a search index from disk, loading shards and document chunks as queries need them"""
+
+    def __init__(self, static_dir: str):
+        self.root = search_dir(static_dir)
+        self.meta = output.load(os.path.join(self.root, "index.json"))
+        self.shards: Dict[int, Dict[str, List[int]]] = {}
+        self.chunks: Dict[int, List] = {}
+
+    def shard(self, i: int) -> Dict[str, List[int]]:
+        if i not in self.shards:
+            self.shards[i] = output.load(os.path.join(self.root, "shards", "{}.json".format(i)))
+        return self.shards[i]
+
+    def lookup(self, word: str) -> Set[int]:
+        """Doc ids of a token"""
+        i = bisect.bisect_right(self.meta["shards"], word) - 1
+        if i < 0:
+            return set()
+        return set(ungaps(self.shard(i).get(word, [])))
+
+    def lookup_prefix(self, char: str) -> Set[int]:
+        """Doc ids of every token starting with char (they may span shards)"""
+        first = max(bisect.bisect_right(self.meta["shards"], char) - 1, 0)
+        result = set()
+        for i in range(first, len(self.meta["shards"])):
+            if i > first and not self.meta["shards"][i].startswith(char):
+                break
+            for word, values in self.shard(i).items():
+                if word.startswith(char):
+                    result.update(ungaps(values))
+        return result
+
+    def document(self, doc_id: int) -> Dict[str, str]:
+        k = doc_id // self.meta["chunk"]
+        if k not in self.chunks:
+            self.chunks[k] = output.load(os.path.join(self.root, "docs", "{}.json".format(k)))
+        manifest, label, collection = self.chunks[k][doc_id % self.meta["chunk"]]
+        return {"manifest": manifest, "label": label, "collection": collection}
+
+    def search(self, query: str) -> List[Dict[str, str]]:
+        """Documents containing every run of the query, in doc id order"""
+        result = None
+        for run in runs(query):
+            if len(run) < NGRAM:
+                ids = self.lookup_prefix(run)
+            else:
+                ids = set.intersection(*(self.lookup(run[i:i + NGRAM])
+                                         for i in range(len(run) - NGRAM + 1)))
+            result = ids if result is None else result & ids
+            if not result:
+                return []
+        return [self.document(doc_id) for doc_id in sorted(result or ())]
+
@@ -0,0 +1,112 @@
+"""
+Local thumbnails of the downloaded images
+Writes a small JPEG derivative of every downloaded image to
+docs/thumbnails/<md5 of the image URL>.jpg, so that viewers drawing a grid
+of a collection ("vhint": "use-thumb") do not download the full-size
+images. The manifests command uses them for the manifest and canvas
+thumbnails, with their own width and height, whenever one exists.
+
+Images are decoded in JPEG draft mode, as in dataset.phash, at the
+smallest scale still covering the thumbnail, and are resized in parallel
+worker processes. The sizes are kept in iiif/summary/thumbnails.json;
+only new or changed images are done again
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+from . import output
+from .images import url_key
+from .model import Image
+
+# 長辺の最大（ピクセル）
+SIZE = 300
+QUALITY = 80
+
+
+def thumbnail_dir(static_dir: str) -> str:
+    return os.path.join(static_dir, "thumbnails")
+
+
+def index_path(static_dir: str) -> str:
+    return os.path.join(static_dir, "iiif", "summary", "thumbnails.json")
+
+
+def make_thumbnail(job: Tuple[str, str, int]) -> Optional[Dict]:
+    """Write the thumbnail of src to dst; return its size, or None if src cannot be decoded"""
+    from PIL import Image as PILImage
+
+    src, dst, size = job
+    tmp_path = dst + ".tmp"
+    try:
+        with PILImage.open(src) as im:
+            im.draft("RGB", (size, size))
+            im = im.convert("RGB")
+            im.thumbnail((size, size), PILImage.LANCZOS)
+            im.save(tmp_path, "JPEG", quality=QUALITY, optimize=True, progressive=True)
+    except (OSError, ValueError):
+        # 書きかけのファイルを残さない
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+    os.replace(tmp_path, dst)
+
+    return {"width": im.width, "height": im.height, "max": size, "source": os.path.getsize(src)}
+
+
+class Thumbnails:
+    """The thumbnails written under static_dir, published at base_uri/thumbnails"""
+
+    def __init__(self, static_dir: str, base_uri: str):
+        self.dir = thumbnail_dir(static_dir)
+        self.path = index_path(static_dir)
+        self.base_uri = base_uri
+        self.entries: Dict[str, Dict] = {}
+
+        if os.path.exists(self.path):
+            self.entries = output.load(self.path)
+
+    def file(self, key: str) -> str:
+        return os.path.join(self.dir, key + ".jpg")
+
+    def get(self, url: str) -> Optional[Image]:
+        """The thumbnail of an image URL, if one was written"""
+        key = url_key(url)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return Image("{}/thumbnails/{}.jpg".format(self.base_uri, key), entry["width"], entry["height"])
+
+    def update(self, files: Dict[str, str], size: int = SIZE, workers: Optional[int] = None) -> int:
+        """Write the thumbnails of the images ({key: path}) that are new, changed,
+        missing on disk or made at another size; return how many were written"""
+        os.makedirs(self.dir, exist_ok=True)
+
+        todo = []
+        for key, path in sorted(files.items()):
+            entry = self.entries.get(key)
+            if (entry is None or entry["max"] != size or entry["source"] != os.path.getsize(path)
+                    or not os.path.exists(self.file(key))):
+                todo.append(key)
+
+        jobs = [(files[key], self.file(key), size) for key in todo]
+        if workers == 1 or len(jobs) < 2:
+            return self._add(todo, files, map(make_thumbnail, jobs))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return self._add(todo, files, executor.map(make_thumbnail, jobs, chunksize=16))
+
+    def _add(self, keys, files: Dict[str, str], results: Iterable[Optional[Dict]]) -> int:
+        written = 0
+        for key, entry in zip(keys, results):
+            if entry is None:
+                print("cannot decode", files[key])
+                self.entries.pop(key, None)
+            else:
+                self.entries[key] = entry
+                written += 1
+        return written
+
+    def save(self):
+        # iiif/summary の他のファイルと同じく現在のプロファイルで書く
+        output.write_json(self.entries, self.path)
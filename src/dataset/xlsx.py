@@ -0,0 +1,123 @@
+"""
+Streaming XLSX export of the collection metadata
+Writes docs/iiif/metadata/<name>.xlsx for every docs/iiif/collection/*.json:
+one row per manifest (or sub-collection) with its title, a viewer link and
+one column per metadata label, in order of first appearance.
+
+Each collection is read twice as a stream, one entry at a time: a first
+pass collects the column labels, a second writes the rows through an
+openpyxl write-only workbook, so memory does not grow with the number of
+rows. Collections are exported in parallel
+"""
+
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import output
+
+VIEWER = "https://hi-viewer.web.app/mirador/?manifest="
+
+FIELDS = ["Title", "Link"]
+
+
+def iter_entries(path: str, keys: Tuple[str, ...] = ("collections", "manifests")) -> Iterator[Dict]:
+    """Stream the entries of a collection: its sub-collections if it has
+    any, otherwise its manifests, page by page for a paged collection.
+    keys=("manifests",) streams the manifests only"""
+    # コレクションのファイルは collections と manifests のどちらか一方を持つ
+    found = False
+    for entry in output.iter_array(path, keys):
+        found = True
+        yield entry
+    if found:
+        return
+
+    # ページ分割されたコレクションは first / next をたどる（1ページずつ読む）
+    collection_dir = os.path.dirname(path)
+    uri = output.load(path).get("first")
+    while uri:
+        page = output.load(os.path.join(collection_dir, uri.split("/iiif/collection/")[-1]))
+        yield from page["manifests"]
+        uri = page.get("next")
+
+
+def iter_manifests(static_dir: str) -> Iterator[Tuple[str, Dict]]:
+    """(collection name, entry) of every manifest listed in
+    static_dir/iiif/collection/*.json; collections of collections are skipped"""
+    for file in sorted(glob.glob(os.path.join(static_dir, "iiif", "collection", "*.json"))):
+        name = os.path.splitext(os.path.basename(file))[0]
+        for entry in iter_entries(file, ("manifests",)):
+            yield name, entry
+
+
+def columns(path: str) -> List[str]:
+    """First pass: column labels in order of first appearance"""
+    fields = dict.fromkeys(FIELDS)
+    for entry in iter_entries(path):
+        for m in entry.get("metadata", []):
+            fields.setdefault(m["label"])
+    return list(fields)
+
+
+def rows(path: str, fields: List[str]) -> Iterator[List[str]]:
+    """Second pass: one row per entry, multiple values joined with |"""
+    for entry in iter_entries(path):
+        values = {
+            FIELDS[0]: [entry["label"]],
+            FIELDS[1]: [VIEWER + entry["@id"]]
+        }
+        for m in entry.get("metadata", []):
+            values.setdefault(m["label"], []).append(m["value"])
+
+        yield ["|".join(values[field]) if field in values else "" for field in fields]
+
+
+def export_collection(path: str, xlsx_path: str) -> int:
+    """Write the metadata table of one collection; return the number of rows"""
+    from openpyxl import Workbook
+
+    fields = columns(path)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(fields)
+
+    n = 0
+    for row in rows(path, fields):
+        ws.append(row)
+        n += 1
+
+    os.makedirs(os.path.dirname(xlsx_path), exist_ok=True)
+    tmp_path = xlsx_path + ".tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, xlsx_path)
+
+    return n
+
+
+def _export(job) -> str:
+    path, xlsx_path = job
+    n = export_collection(path, xlsx_path)
+    return "{}: {} rows".format(os.path.relpath(xlsx_path), n)
+
+
+def export_all(static_dir: str, workers: Optional[int] = None):
+    """Export every top-level collection under static_dir/iiif/collection"""
+    files = sorted(glob.glob(os.path.join(static_dir, "iiif", "collection", "*.json")))
+    jobs = [(file, os.path.join(static_dir, "iiif", "metadata",
+                                os.path.splitext(os.path.basename(file))[0] + ".xlsx"))
+            for file in files]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or len(jobs) < 2:
+        for job in jobs:
+            print(_export(job))
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        for line in executor.map(_export, jobs):
+            print(line)